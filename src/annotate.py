@@ -0,0 +1,168 @@
+import json
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# the class names go first, as JSON behind a length word
+_NAMES_SIZE = 4096
+# box rows are x1, y1, x2, y2, track id, conf, class; row 0 of each slot
+# holds the box count and the locked track id
+_COLS = 7
+
+# BGR, one per class; the locked target is always red
+_PALETTE = [
+    (56, 180, 255),
+    (255, 160, 40),
+    (80, 220, 80),
+    (255, 80, 200),
+    (0, 230, 230),
+    (200, 120, 255),
+]
+_LOCKED = (0, 0, 255)
+
+
+class BoxTable:
+    """Boxes of the frames in an output FrameRing, in shared memory.
+
+    One entry per ring slot. The producer calls write() between the ring's
+    begin() and commit(), so the ring's seqlock covers the boxes too: a
+    consumer reads them with read() and checks ring.valid() afterwards. The
+    model's class names are written once with set_names().
+    """
+
+    def __init__(self, name, slots, max_boxes=100):
+        size = _NAMES_SIZE + slots * (max_boxes + 1) * _COLS * 4
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.shm.buf[:8] = bytes(8)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.name = self.shm.name
+        self.slots = slots
+        self.max_boxes = max_boxes
+        self.names_len = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.rows = np.ndarray(
+            (slots, max_boxes + 1, _COLS),
+            dtype=np.float32,
+            buffer=self.shm.buf,
+            offset=_NAMES_SIZE,
+        )
+        self.names = None
+
+    @classmethod
+    def create(cls, slots, max_boxes=100):
+        return cls(None, slots, max_boxes)
+
+    def set_names(self, names):
+        # {class index: name} as YOLO's model.names
+        data = json.dumps({int(k): v for k, v in names.items()}).encode()
+        if len(data) > _NAMES_SIZE - 8:
+            return
+        self.shm.buf[8 : 8 + len(data)] = data
+        self.names_len[0] = len(data)
+
+    def class_names(self):
+        if self.names is None and self.names_len[0]:
+            data = bytes(self.shm.buf[8 : 8 + int(self.names_len[0])])
+            self.names = {int(k): v for k, v in json.loads(data).items()}
+        return self.names or {}
+
+    def write(self, frame_id, boxes, locked=None):
+        # boxes as rows of x1, y1, x2, y2, track id (-1 untracked), conf, class
+        entry = self.rows[frame_id % self.slots]
+        n = min(len(boxes), self.max_boxes)
+        entry[0, 0] = n
+        entry[0, 1] = -1 if locked is None else locked
+        entry[1 : n + 1] = boxes[:n]
+
+    def read(self, frame_id):
+        # (boxes, locked id or None), a copy; check ring.valid() afterwards
+        entry = self.rows[frame_id % self.slots]
+        n = min(int(entry[0, 0]), self.max_boxes)
+        locked = int(entry[0, 1])
+        return entry[1 : n + 1].copy(), None if locked < 0 else locked
+
+    def close(self):
+        self.names_len = None
+        self.rows = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def draw(frame, boxes, names=None, locked=None, thickness=2):
+    """Draws boxes and labels into frame in place.
+
+    Only rectangles and one line of text per box, no copy of the frame and
+    no per-call allocations beyond the label strings.
+    """
+    names = names or {}
+    h, w = frame.shape[:2]
+    scale = max(h / 1200, 0.4)
+    for x1, y1, x2, y2, track_id, conf, cls in boxes:
+        track_id = int(track_id)
+        cls = int(cls)
+        if locked is not None and track_id == locked:
+            color = _LOCKED
+            width = thickness * 2
+        else:
+            color = _PALETTE[cls % len(_PALETTE)]
+            width = thickness
+        p1 = (int(x1), int(y1))
+        cv2.rectangle(frame, p1, (int(x2), int(y2)), color, width)
+
+        label = names.get(cls, str(cls))
+        if track_id >= 0:
+            label = f"id:{track_id} {label}"
+        label = f"{label} {conf:.2f}"
+        (tw, th), base = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, scale, 1)
+        # above the box, or inside it at the top edge of the frame
+        top = p1[1] - th - base if p1[1] - th - base >= 0 else p1[1]
+        left = min(max(p1[0], 0), max(w - tw, 0))
+        cv2.rectangle(frame, (left, top), (left + tw, top + th + base), color, -1)
+        cv2.putText(
+            frame,
+            label,
+            (left, top + th),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            scale,
+            (255, 255, 255),
+            1,
+            cv2.LINE_AA,
+        )
+    return frame
+
+
+def metadata(frame_id, ts, shape, boxes, locked, ptz=None, names=None, image=False):
+    """JSON text message describing one frame, for the display websocket.
+
+    {"frame": input frame id, "ts": capture time.monotonic_ns(),
+     "size": [width, height] of the frame the boxes are in,
+     "boxes": [[x1, y1, x2, y2, track id or -1, conf, class], ...],
+     "locked": track id or null, "image": true if a JPEG of this frame
+     follows, "ptz": {"pan", "tilt", "zoom", "moving", "age"} or null,
+     "names": {class: name}, only in the first message of a connection}
+    """
+    message = {
+        "frame": frame_id,
+        "ts": ts,
+        "size": [shape[1], shape[0]],
+        "boxes": [
+            [
+                *(round(float(v), 1) for v in row[:4]),
+                int(row[4]),
+                round(float(row[5]), 3),
+                int(row[6]),
+            ]
+            for row in boxes
+        ],
+        "locked": locked,
+        "image": image,
+        "ptz": ptz,
+    }
+    if names is not None:
+        message["names"] = names
+    return json.dumps(message, separators=(",", ":"))
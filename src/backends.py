@@ -0,0 +1,133 @@
+import importlib.util
+import json
+import os
+import platform
+import time
+
+import numpy as np
+from ultralytics import YOLO
+
+# Inference backends, all loaded through ultralytics' YOLO so they give the
+# same Results (boxes, scores, track ids). Files come from
+#
+#   yolo export model=best.pt format=onnx
+#   yolo export model=best.pt format=openvino int8=True data=coco128.yaml
+#   yolo export model=best.pt format=tflite
+#   yolo export model=best.pt format=edgetpu
+#
+# name: (file, runtime modules any of which will do, YOLO overrides)
+BACKENDS = {
+    "edgetpu": (
+        "{w}_full_integer_quant_edgetpu.tflite",
+        ("tflite_runtime", "tensorflow"),
+        {},
+    ),
+    "pytorch": ("{w}.pt", ("torch",), {}),
+    "onnxruntime": ("{w}.onnx", ("onnxruntime",), {}),
+    "openvino": ("{w}_openvino_model", ("openvino",), {}),
+    "tflite": (
+        "{w}_saved_model/{w}_float32.tflite",
+        ("tflite_runtime", "tensorflow"),
+        {},
+    ),
+    "opencv": ("{w}.onnx", ("cv2",), {"dnn": True}),
+}
+
+
+def _cpu_name():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                # "model name" on x86, "Model" or "CPU part" on ARM boards
+                if line.split(":")[0].strip() in ("model name", "Model", "CPU part"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def available(weights="best"):
+    # backends whose file exists and whose runtime is installed; checked
+    # here so ultralytics never tries to pip install a missing runtime
+    found = {}
+    for name, (pattern, modules, overrides) in BACKENDS.items():
+        path = pattern.format(w=weights)
+        if not os.path.exists(path):
+            continue
+        if not any(importlib.util.find_spec(m) for m in modules):
+            continue
+        found[name] = (path, overrides)
+    return found
+
+
+def _load(path, overrides):
+    model = YOLO(path, task="detect")
+    model.overrides.update(overrides)
+    return model
+
+
+def _time(model, frame, runs):
+    for _ in range(3):
+        model.predict(frame, verbose=False)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.predict(frame, verbose=False)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def load_model(backend="auto", weights="best", sample=None, runs=10, cache=None):
+    """YOLO model for backend, or the fastest available one for "auto".
+
+    sample() returns a frame to benchmark on, it is only called when there
+    is no cached choice for this CPU and these model files. The benchmark
+    results are kept in cache (backend_cache.json next to the weights).
+    """
+    found = available(weights)
+    if backend != "auto":
+        if backend not in found:
+            raise ValueError(f"backend '{backend}' not available, have {list(found)}")
+        return _load(*found[backend])
+    if not found:
+        raise ValueError(f"no model files for '{weights}' with an installed runtime")
+
+    cache = cache or os.path.join(os.path.dirname(weights) or ".", "backend_cache.json")
+    files = sorted(
+        (name, os.path.getmtime(path), os.path.getsize(path))
+        for name, (path, _) in found.items()
+    )
+    key = f"{platform.machine()} {_cpu_name()} x{os.cpu_count()} {weights} {files}"
+    try:
+        with open(cache) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+
+    choice = cached.get(key, {}).get("backend")
+    if choice in found:
+        print(f"inference backend {choice} (cached)")
+        return _load(*found[choice])
+
+    frame = sample()
+    timings = {}
+    best = None
+    for name, (path, overrides) in found.items():
+        try:
+            model = _load(path, overrides)
+            timings[name] = _time(model, frame, runs)
+        except Exception as e:
+            # e.g. the Edge TPU delegate without the device
+            print(f"inference backend {name} failed: {e}")
+            continue
+        print(f"inference backend {name}: {timings[name] * 1000:.1f} ms")
+        if best is None or timings[name] < timings[best[0]]:
+            best = (name, model)
+
+    if best is None:
+        raise ValueError("no inference backend could run")
+    cached[key] = {"backend": best[0], "timings": timings}
+    with open(cache, "w") as f:
+        json.dump(cached, f, indent=2)
+    print(f"inference backend {best[0]} (fastest)")
+    return best[1]
@@ -0,0 +1,297 @@
+# Micro-benchmarks of the per-frame hot spots, written to a JSON file so runs
+# on different releases and machines can be compared.
+#
+#   python bench.py [--repeat 2000] [--out bench.json] [--compare old.json]
+#
+# Times are per call in microseconds. Benchmarks whose dependencies are not
+# installed (ultralytics for the tracker, the MPU driver) are recorded as
+# skipped.
+
+import argparse
+import json
+import platform
+import subprocess
+import threading
+import time
+from multiprocessing import Value
+
+import cv2
+import numpy as np
+
+SHAPE = (576, 704, 3)
+
+
+def _measure(fn, repeat, warmup=20):
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        t = time.perf_counter_ns()
+        fn()
+        samples[i] = time.perf_counter_ns() - t
+    samples /= 1000
+    return {
+        "n": repeat,
+        "mean_us": float(samples.mean()),
+        "p50_us": float(np.percentile(samples, 50)),
+        "p99_us": float(np.percentile(samples, 99)),
+        "min_us": float(samples.min()),
+    }
+
+
+def _frame():
+    # something that compresses like the real sky, not noise
+    from ptz_sim import Scene
+
+    return Scene(SHAPE, targets=3).render(0.0, 5.0, 1.0)
+
+
+def bench_process_boxes(repeat):
+    import torch
+    from ultralytics.engine.results import Boxes
+
+    from ptz_mailbox import CommandMailbox
+    from tracker import Tracker
+
+    rng = np.random.default_rng(0)
+    results = {}
+    for tracks in (0, 1, 5, 20, 50):
+        tracker = Tracker(
+            *(Value("f", 0) for _ in range(3)),
+            time.perf_counter(),
+            None,
+            Value("f", 0),
+            Value("f", 0),
+            None,
+            Value("f", 0),
+            CommandMailbox(),
+        )
+        # x1, y1, x2, y2, track id, conf, class
+        xy = rng.uniform(0, 600, (tracks, 2))
+        data = np.column_stack(
+            [
+                xy,
+                xy + rng.uniform(5, 50, (tracks, 2)),
+                np.arange(1, tracks + 1),
+                rng.uniform(0.3, 1.0, tracks),
+                np.zeros(tracks),
+            ]
+        )
+        boxes = Boxes(torch.tensor(data, dtype=torch.float32), SHAPE[:2])
+        results[f"process_boxes[{tracks}]"] = _measure(
+            lambda: tracker.process_boxes(boxes), repeat
+        )
+    return results
+
+
+def bench_mpu(repeat):
+    from mpu import calculate_angle, oproj
+
+    # readMagnetometerMaster/readAccelerometerMaster return lists
+    mag = [21.5, -3.2, 40.1]
+    acc = [0.02, -0.01, 0.98]
+    return {
+        "oproj": _measure(lambda: oproj(mag, acc), repeat),
+        "calculate_angle": _measure(lambda: calculate_angle(mag, acc), repeat),
+    }
+
+
+def bench_cart2pol(repeat):
+    from tracker import cart2pol
+
+    return {"cart2pol": _measure(lambda: cart2pol(0.3, -0.2), repeat)}
+
+
+def bench_ring_copy(repeat):
+    from frame_ring import FrameRing
+    from orientation import orient_frame
+
+    frame = _frame()
+    ring = FrameRing.create(SHAPE, np.uint8, 8)
+
+    def publish(orientation):
+        frame_id, dst = ring.begin()
+        orient_frame(frame, dst, orientation)
+        ring.commit(frame_id)
+
+    try:
+        return {
+            "ring_copy[none]": _measure(lambda: publish("none"), repeat),
+            "ring_copy[rot180]": _measure(lambda: publish("rot180"), repeat),
+        }
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+def bench_imencode(repeat):
+    frame = _frame()
+    results = {}
+    # 65 is what display sends, 85 what ptz_sim streams
+    for quality in (65, 85):
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        results[f"imencode[q{quality}]"] = _measure(
+            lambda: cv2.imencode(".jpg", frame, params), repeat
+        )
+    return results
+
+
+def _boxes(count):
+    # x1, y1, x2, y2, track id, conf, class
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 600, (count, 2))
+    return np.column_stack(
+        [
+            xy,
+            xy + rng.uniform(5, 50, (count, 2)),
+            np.arange(1, count + 1),
+            rng.uniform(0.3, 1.0, count),
+            np.zeros(count),
+        ]
+    ).astype(np.float32)
+
+
+def bench_draw(repeat):
+    from annotate import draw
+
+    frame = _frame()
+    dst = frame.copy()
+    results = {}
+    for count in (1, 5, 20):
+        boxes = _boxes(count)
+        results[f"draw[{count}]"] = _measure(
+            lambda: draw(dst, boxes, {0: "drone"}, locked=1), repeat
+        )
+    return results
+
+
+def bench_plot(repeat):
+    # what inference used to run per displayed frame, for comparison with draw
+    import torch
+    from ultralytics.engine.results import Results
+
+    frame = _frame()
+    results = {}
+    for count in (1, 5, 20):
+        result = Results(
+            frame,
+            path="",
+            names={0: "drone"},
+            boxes=torch.as_tensor(_boxes(count)),
+        )
+        results[f"plot[{count}]"] = _measure(result.plot, repeat)
+    return results
+
+
+def bench_send_xml(repeat):
+    from camera_control import PtzControl, PtzResponse
+    from isapi_mock import IsapiServer
+
+    server = IsapiServer(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cam = PtzControl("admin", "1plus2jest3", "127.0.0.1", server.server_address[1])
+
+    # payload construction only, the request itself is replaced by a no-op
+    offline = PtzControl("admin", "1plus2jest3", "127.0.0.1", 9)
+    offline.send_xml = lambda xml_data, endpoint, method="PUT": PtzResponse.OK
+
+    try:
+        return {
+            "continuous_payload": _measure(
+                lambda: offline.continuous(34, -10, 0), repeat
+            ),
+            "absolute_payload": _measure(lambda: offline.absolute(120, 35, 1), repeat),
+            # alternate so nothing upstream can short-circuit a repeat
+            "continuous_round_trip": _measure(
+                lambda: cam.continuous(time.perf_counter_ns() % 2 * 34, 0, 0),
+                min(repeat, 500),
+            ),
+        }
+    finally:
+        cam.close()
+        offline.close()
+        server.shutdown()
+        server.server_close()
+
+
+BENCHES = {
+    "process_boxes": bench_process_boxes,
+    "mpu": bench_mpu,
+    "cart2pol": bench_cart2pol,
+    "ring_copy": bench_ring_copy,
+    "imencode": bench_imencode,
+    "draw": bench_draw,
+    "plot": bench_plot,
+    "send_xml": bench_send_xml,
+}
+
+
+def _environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "commit": commit,
+    }
+
+
+def _compare(results, old_path):
+    with open(old_path) as f:
+        old = json.load(f)["results"]
+    for name, stats in results.items():
+        before = old.get(name, {})
+        if "p50_us" not in stats or "p50_us" not in before:
+            continue
+        ratio = stats["p50_us"] / before["p50_us"]
+        flag = "  <-- slower" if ratio > 1.1 else ""
+        print(
+            f"{name:>24}: p50 {before['p50_us']:9.1f} -> {stats['p50_us']:9.1f} us "
+            f"({ratio:5.2f}x){flag}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--out", help="default bench_<host>_<time>.json")
+    parser.add_argument("--compare", help="earlier result file")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHES))
+    args = parser.parse_args()
+
+    env = _environment()
+    results = {}
+    for group, bench in BENCHES.items():
+        if args.only and group not in args.only:
+            continue
+        try:
+            group_results = bench(args.repeat)
+        except ImportError as e:
+            print(f"{group:>24}: skipped, {e}")
+            results[group] = {"skipped": str(e)}
+            continue
+        for name, stats in group_results.items():
+            print(
+                f"{name:>24}: p50 {stats['p50_us']:9.1f} us  "
+                f"p99 {stats['p99_us']:9.1f} us  mean {stats['mean_us']:9.1f} us"
+            )
+        results.update(group_results)
+
+    out = args.out or time.strftime(f"bench_{env['host']}_%Y%m%d_%H%M%S.json")
+    with open(out, "w") as f:
+        json.dump({"environment": env, "results": results}, f, indent=2)
+    print(f"written to {out}")
+
+    if args.compare:
+        _compare(results, args.compare)
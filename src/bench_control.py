@@ -0,0 +1,185 @@
+# Simulated pan/tilt loop: the old bang-bang logic from Tracker.track against
+# PanTiltController.
+#
+#   python bench_control.py [--runs 50] [--latency 0.15]
+#
+# A target starts at a random offset and drifts at a random angular speed.
+# The tracker runs at 10 Hz, commands reach the camera after --latency
+# seconds, the camera turns at --deg-per-unit degrees per second per speed
+# unit. Bang-bang sends its command on every tick, like the old cmd_q loop;
+# PanTiltController goes through a CommandMailbox, so its repeats are
+# suppressed the same way as on the real system. Every command sent counts.
+#
+# --sim runs PanTiltController in closed loop against ptz_sim instead, in
+# real time: the inverted camera's frames are rotated like in the pipeline,
+# the target is found by its colour and the commands go to the PtzModel. It
+# checks that the simulator's directions match the tracker's and prints
+# whether the target got centred and stayed in view.
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from pan_tilt import PanTiltController
+from ptz_commands import Command, Op
+from ptz_mailbox import CommandMailbox
+
+DT = 0.01
+TRACK_INTERVAL = 0.1
+
+
+class BangBang:
+    # Tracker.track before PanTiltController, one command per tick
+    mailbox = False
+
+    def __init__(self, speed=-34):
+        self.speed = speed
+
+    def reset(self):
+        pass
+
+    def update(self, x, y, now):
+        pan = 0
+        tilt = 0
+        if x > 0.6:
+            pan = self.speed
+        elif x < 0.4:
+            pan = -1 * self.speed
+
+        if y > 0.6:
+            tilt = -1 * self.speed
+        elif y < 0.4:
+            tilt = self.speed
+        return pan, tilt
+
+
+def simulate(controller, rng, args):
+    fov = np.array([args.hfov, args.hfov * 576 / 704])
+    # target offset from the optical axis in degrees, and its drift
+    offset = rng.uniform(-0.45, 0.45, 2) * fov
+    drift = rng.uniform(-1, 1, 2) * args.drift
+    camera_speed = np.zeros(2)
+    in_flight = []
+
+    # the mailbox stamps commands with time.monotonic(), keep suppression in
+    # simulated time by handing it our own timestamps
+    mailbox = CommandMailbox(repeat_interval=1.0)
+    use_mailbox = getattr(controller, "mailbox", True)
+    sent = 0
+    controller.reset()
+
+    centred_at = None
+    in_band_since = None
+    errors = []
+    next_track = 0.0
+    t = 0.0
+
+    while t < args.duration:
+        if t >= next_track:
+            next_track += TRACK_INTERVAL
+            x, y = 0.5 + offset / fov
+            pan, tilt = controller.update(x, y, t)
+            cmd = Command(Op.CONT, pan=pan, tilt=tilt, ts=t)
+            if not use_mailbox or mailbox.post(cmd):
+                sent += 1
+                in_flight.append((t + args.latency, pan, tilt))
+
+        while in_flight and in_flight[0][0] <= t:
+            _, pan, tilt = in_flight.pop(0)
+            # negative pan moves the target left, positive tilt moves it up
+            camera_speed = np.array([-pan, tilt]) * args.deg_per_unit
+
+        offset += (drift - camera_speed) * DT
+
+        error = np.abs(offset / fov)
+        errors.append(error.max())
+        if error.max() < 0.1:
+            if in_band_since is None:
+                in_band_since = t
+            elif centred_at is None and t - in_band_since >= 0.5:
+                centred_at = in_band_since
+        else:
+            in_band_since = None
+
+        t += DT
+
+    return (
+        centred_at,
+        sent / args.duration,
+        np.sqrt(np.mean(np.square(errors))),
+    )
+
+
+def sim_check(seconds, shape=(576, 704, 3)):
+    from orientation import orient_frame
+    from ptz_sim import PtzModel, Scene
+
+    model = PtzModel()
+    scene = Scene(shape, targets=1)
+    controller = PanTiltController()
+    # start with the target well off centre
+    target = scene.targets[0]
+    model.pan = (target["az"] - 0.3 * scene.hfov) % 360
+    model.tilt = target["el"] - 0.15 * scene.hfov
+    frame = np.empty(shape, dtype=np.uint8)
+    steps = centred = lost = 0
+    centred_at = None
+    start = time.monotonic()
+    while time.monotonic() - start < seconds:
+        steps += 1
+        orient_frame(scene.render(*model.pose()), frame, "rot180")
+        # the target is the only dark grey in the picture
+        ys, xs = np.nonzero(cv2.inRange(frame, (30, 30, 30), (50, 50, 50)))
+        if not len(xs):
+            lost += 1
+            controller.reset()
+            model.continuous(0, 0, 0)
+        else:
+            x, y = xs.mean() / shape[1], ys.mean() / shape[0]
+            pan, tilt = controller.update(x, y, time.monotonic() - start)
+            model.continuous(pan, tilt, 0)
+            if max(abs(x - 0.5), abs(y - 0.5)) < 0.1:
+                centred += 1
+                if centred_at is None:
+                    centred_at = time.monotonic() - start
+        time.sleep(TRACK_INTERVAL)
+
+    print(
+        f"closed loop against ptz_sim: centred after "
+        f"{'never' if centred_at is None else f'{centred_at:.1f} s'}, "
+        f"{centred}/{steps} steps centred, lost {lost}, "
+        f"{'OK' if centred > steps / 2 and not lost else 'FAILED'}"
+    )
+    return centred > steps / 2 and not lost
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--latency", type=float, default=0.15)
+    parser.add_argument("--hfov", type=float, default=60.0)
+    parser.add_argument("--deg-per-unit", type=float, default=0.5)
+    parser.add_argument("--drift", type=float, default=5.0, help="deg/s")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sim", type=float, metavar="SECONDS")
+    args = parser.parse_args()
+
+    if args.sim:
+        raise SystemExit(0 if sim_check(args.sim) else 1)
+
+    for name, controller in (
+        ("bang-bang", BangBang()),
+        ("proportional", PanTiltController()),
+    ):
+        rng = np.random.default_rng(args.seed)
+        results = [simulate(controller, rng, args) for _ in range(args.runs)]
+        centred = [r[0] for r in results if r[0] is not None]
+        print(
+            f"{name:>12}: centred {len(centred)}/{args.runs}  "
+            f"time-to-centre median {np.median(centred) if centred else float('nan'):.2f} s  "
+            f"commands {np.mean([r[1] for r in results]):.2f}/s  "
+            f"rms offset {np.mean([r[2] for r in results]):.3f}"
+        )
@@ -0,0 +1,157 @@
+# Display JPEG encoding in the event loop against the JpegPool threads.
+#
+#   python bench_encode.py [--seconds 5] [--workers 1 2 4] [--quality 65]
+#
+# For 704x576 and 1920x1080 frames each mode encodes and sends JPEGs over a
+# local websocket as fast as it can, with boxes drawn in, and prints the
+# frames per second it reached. Meanwhile a 1 ms heartbeat task runs on the
+# same event loop; how late it wakes up is the time the loop was stalled,
+# what pings, reconnects and metadata messages would have waited for.
+
+import argparse
+import asyncio
+import threading
+import time
+
+import cv2
+import numpy as np
+import websockets
+
+from annotate import draw
+from display import JpegPool, _send
+from frame_ring import FrameRing
+from latency import SEND
+from ptz_sim import Scene
+
+SHAPES = [(576, 704, 3), (1080, 1920, 3)]
+BOXES = np.array(
+    [[100, 120, 160, 170, 1, 0.91, 0], [300, 200, 330, 240, 2, 0.55, 0]],
+    dtype=np.float32,
+)
+
+
+class _Trace:
+    # _send marks SEND after every JPEG that went out, count those
+    def __init__(self):
+        self.sent = 0
+
+    def mark(self, frame_id, stage):
+        if stage == SEND:
+            self.sent += 1
+
+
+def _sink(port, ready):
+    async def receive(websocket):
+        async for _ in websocket:
+            pass
+
+    async def serve():
+        async with websockets.serve(receive, "127.0.0.1", port, max_size=None):
+            ready.set()
+            await asyncio.Future()
+
+    asyncio.run(serve())
+
+
+async def _heartbeat(stalls, done):
+    while not done.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(time.perf_counter() - start - 0.001)
+
+
+async def _inline(ring, frame_id, websocket, quality, seconds):
+    # what display did before JpegPool
+    frame = ring.edit(frame_id)
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    sent = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        draw(frame, BOXES, locked=1)
+        data = cv2.imencode(".jpg", frame, params)[1]
+        await websocket.send(data.tobytes())
+        sent += 1
+        # display waits for the next frame here
+        await asyncio.sleep(0)
+    return sent
+
+
+async def _pooled(ring, frame_id, websocket, quality, seconds, workers):
+    pool = JpegPool(ring.frames.shape[1:], workers, quality)
+    outbox = asyncio.Queue(workers + 2)
+    trace = _Trace()
+    sender = asyncio.create_task(_send(websocket, outbox, trace))
+    frame = ring.edit(frame_id)
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        if pool.full():
+            await pool.idle()
+            continue
+        if outbox.full():
+            await asyncio.sleep(0.005)
+            continue
+        jpeg = pool.submit(ring, frame_id, frame_id, frame, BOXES, {}, 1, "annotated")
+        outbox.put_nowait((None, jpeg, frame_id))
+    sender.cancel()
+    pool.close()
+    return trace.sent
+
+
+async def _run(shape, mode, workers, port, quality, seconds):
+    ring = FrameRing.create(shape, np.uint8, 2)
+    ring.publish(Scene(shape, targets=3).render(0.0, 5.0, 1.0))
+    frame_id = ring.latest_id()
+    stalls = []
+    done = asyncio.Event()
+    try:
+        async with websockets.connect(
+            f"ws://127.0.0.1:{port}", ping_interval=None, max_size=None
+        ) as websocket:
+            heartbeat = asyncio.create_task(_heartbeat(stalls, done))
+            await asyncio.sleep(0)
+            if mode == "inline":
+                sent = await _inline(ring, frame_id, websocket, quality, seconds)
+            else:
+                sent = await _pooled(
+                    ring, frame_id, websocket, quality, seconds, workers
+                )
+            done.set()
+            await heartbeat
+    finally:
+        ring.close()
+        ring.unlink()
+
+    stalls = np.array(stalls) * 1000
+    return {
+        "fps": sent / seconds,
+        "stall_p50_ms": float(np.percentile(stalls, 50)),
+        "stall_p99_ms": float(np.percentile(stalls, 99)),
+        "stall_max_ms": float(stalls.max()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    parser.add_argument("--quality", type=int, default=65)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    ready = threading.Event()
+    threading.Thread(target=_sink, args=(args.port, ready), daemon=True).start()
+    ready.wait()
+
+    modes = [("inline", 0)] + [(f"pool x{n}", n) for n in args.workers]
+    for shape in SHAPES:
+        print(f"{shape[1]}x{shape[0]}")
+        for name, workers in modes:
+            mode = "inline" if not workers else "pool"
+            r = asyncio.run(
+                _run(shape, mode, workers, args.port, args.quality, args.seconds)
+            )
+            print(
+                f"{name:>10}: {r['fps']:7.1f} fps  loop stall p50 "
+                f"{r['stall_p50_ms']:6.2f} ms  p99 {r['stall_p99_ms']:6.2f} ms  "
+                f"max {r['stall_max_ms']:6.2f} ms"
+            )
@@ -0,0 +1,77 @@
+# Round trip of PTZ commands against the local ISAPI mock.
+#
+#   python bench_ptz.py [--commands 500] [--latency 0.002]
+#
+# "per-request" is the old behaviour: requests.put() with a new connection for
+# every command. "session" is PtzControl with its keep-alive session.
+
+import argparse
+import threading
+import time
+
+import numpy as np
+import requests
+
+from camera_control import PtzControl, PtzResponse
+from isapi_mock import IsapiServer
+
+
+def _per_request(cam):
+    # PtzControl.send_xml before the session was introduced
+    def send_xml(xml_data, endpoint, method="PUT"):
+        response = requests.request(
+            method,
+            endpoint,
+            headers={"Content-Type": "application/xml"},
+            data=xml_data.encode(),
+            auth=cam.auth,
+            timeout=0.25,
+        )
+        return PtzResponse.OK if response.status_code == 200 else PtzResponse.OTHER
+
+    cam.send_xml = send_xml
+    return cam
+
+
+def run(mode, commands, latency):
+    server = IsapiServer(("127.0.0.1", 0), latency=latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    cam = PtzControl("admin", "1plus2jest3", "127.0.0.1", server.server_address[1])
+    if mode == "per-request":
+        cam = _per_request(cam)
+
+    rtts = []
+    failed = 0
+    start = time.perf_counter()
+    for i in range(commands):
+        t = time.perf_counter()
+        if cam.continuous(i % 2 * 34, 0, 0) != PtzResponse.OK:
+            failed += 1
+        rtts.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+
+    cam.close()
+    server.shutdown()
+    server.server_close()
+
+    rtts = np.array(rtts) * 1000
+    stats = server.stats
+    print(
+        f"{mode:>12}: {commands / elapsed:7.1f} cmd/s  "
+        f"p50 {np.percentile(rtts, 50):6.2f} ms  "
+        f"p99 {np.percentile(rtts, 99):6.2f} ms  "
+        f"connections {stats['connections']}  401s {stats['challenges']}  "
+        f"failed {failed}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commands", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    for mode in ("per-request", "session"):
+        run(mode, args.commands, args.latency)
@@ -0,0 +1,123 @@
+# Tiled against single-pass detection on recorded footage.
+#
+#   python bench_tiles.py recording.mkv --model best.pt [--tiles 640 960]
+#       [--labels labels_dir] [--frames 300]
+#
+# For every mode prints frames per second of detection (preprocessing, the
+# model and the tile merge) and detections per frame. With --labels, a
+# directory of YOLO txt files named <frame index>.txt (class cx cy w h,
+# normalized), recall and precision at IoU 0.5 against them. Without labels
+# the tiled modes are compared to the single pass: "found" is the share of
+# single-pass detections a mode also has, "extra" what it finds on top.
+
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from tiles import predict_windows, tile_windows
+
+
+def _iou(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter)
+
+
+def _matched(truth, found, threshold=0.5):
+    # greedy one to one matching, returns how many of truth were found
+    if not len(truth) or not len(found):
+        return 0
+    iou = _iou(truth, found)
+    matched = 0
+    while iou.size and iou.max() >= threshold:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        iou[i, :] = 0
+        iou[:, j] = 0
+        matched += 1
+    return matched
+
+
+def _labels(path, shape):
+    h, w = shape[:2]
+    if not os.path.exists(path):
+        return np.empty((0, 4))
+    rows = np.loadtxt(path, ndmin=2)
+    if not rows.size:
+        return np.empty((0, 4))
+    cx, cy, bw, bh = rows[:, 1] * w, rows[:, 2] * h, rows[:, 3] * w, rows[:, 4] * h
+    return np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], 1)
+
+
+def detect(model, frame, tile, conf):
+    if not tile:
+        result = model.predict(frame, conf=conf, verbose=False)[0]
+        return result.boxes.data.cpu().numpy()[:, :4]
+
+    windows = tile_windows(frame.shape, tile)
+    return predict_windows(model, frame, windows, tile, conf=conf)[:, :4]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video")
+    parser.add_argument("--model", default="best.pt")
+    parser.add_argument("--tiles", type=int, nargs="*", default=[640])
+    parser.add_argument("--labels")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--conf", type=float, default=0.25)
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.video)
+    frames = []
+    while len(frames) < args.frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+
+    model = YOLO(args.model)
+    modes = [0, *args.tiles]
+    detections = {}
+    for tile in modes:
+        # warm up, the first calls include setup
+        detect(model, frames[0], tile, args.conf)
+        start = time.perf_counter()
+        detections[tile] = [detect(model, f, tile, args.conf) for f in frames]
+        elapsed = time.perf_counter() - start
+
+        name = f"tiles {tile}" if tile else "single pass"
+        found = sum(len(d) for d in detections[tile])
+        line = (
+            f"{name:>12}: {len(frames) / elapsed:6.2f} fps  "
+            f"{found / len(frames):5.2f} detections/frame"
+        )
+        if args.labels:
+            truth = [
+                _labels(os.path.join(args.labels, f"{i}.txt"), f.shape)
+                for i, f in enumerate(frames)
+            ]
+            total = sum(len(t) for t in truth)
+            hits = sum(_matched(t, d) for t, d in zip(truth, detections[tile]))
+            line += (
+                f"  recall {hits / max(total, 1):.3f}"
+                f"  precision {hits / max(found, 1):.3f}"
+            )
+        elif tile:
+            single = sum(len(d) for d in detections[0])
+            hits = sum(_matched(s, d) for s, d in zip(detections[0], detections[tile]))
+            line += (
+                f"  found {hits / max(single, 1):.3f} of single pass"
+                f"  extra {found - hits}"
+            )
+        print(line)
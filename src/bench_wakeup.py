@@ -0,0 +1,106 @@
+# Compares the old 1 ms sleep polling loop with Notifier wakeups.
+#
+#   python bench_wakeup.py [--idle 5] [--frames 200] [--interval 0.02]
+#
+# For each mode a consumer process first sits idle (no frames) and reports the
+# CPU time it burned, then the producer signals frames at a fixed interval and
+# the consumer reports how long after the signal it woke up.
+
+import argparse
+import multiprocessing
+import os
+import time
+from multiprocessing import Value
+
+import numpy as np
+
+from notify import Notifier
+
+
+def _poll_consumer(new_frame, sent_at, stop_flag, idle, results):
+    start = os.times()
+    latencies = []
+    idle_until = time.perf_counter() + idle
+    idle_cpu = None
+
+    while stop_flag.value == 0:
+        if idle_cpu is None and time.perf_counter() > idle_until:
+            now = os.times()
+            idle_cpu = (now.user + now.system) - (start.user + start.system)
+
+        if new_frame.value == 1:
+            latencies.append(time.perf_counter() - sent_at.value)
+            new_frame.value = 0
+        else:
+            time.sleep(0.001)
+
+    results.put((idle_cpu, latencies))
+
+
+def _event_consumer(event, sent_at, stop_flag, idle, results):
+    start = os.times()
+    latencies = []
+    idle_until = time.perf_counter() + idle
+    idle_cpu = None
+
+    while stop_flag.value == 0:
+        if idle_cpu is None and time.perf_counter() > idle_until:
+            now = os.times()
+            idle_cpu = (now.user + now.system) - (start.user + start.system)
+
+        if event.wait(0.25):
+            latencies.append(time.perf_counter() - sent_at.value)
+
+    results.put((idle_cpu, latencies))
+
+
+def run(mode, idle, frames, interval):
+    new_frame = Value("i", 0)
+    sent_at = Value("d", 0)
+    stop_flag = Value("i", 0)
+    event = Notifier()
+    results = multiprocessing.Queue()
+
+    if mode == "poll":
+        target, signal = _poll_consumer, new_frame
+    else:
+        target, signal = _event_consumer, event
+
+    p = multiprocessing.Process(
+        target=target, args=(signal, sent_at, stop_flag, idle, results)
+    )
+    p.start()
+
+    time.sleep(idle + 0.3)
+    for _ in range(frames):
+        sent_at.value = time.perf_counter()
+        if mode == "poll":
+            new_frame.value = 1
+        else:
+            event.set()
+        time.sleep(interval)
+
+    stop_flag.value = 1
+    idle_cpu, latencies = results.get()
+    p.join()
+    event.close()
+
+    latencies = np.array(latencies) * 1000
+    print(
+        f"{mode:>5}: idle cpu {100 * idle_cpu / idle:5.2f}%  "
+        f"wakeups {len(latencies)}/{frames}  "
+        f"latency p50 {np.percentile(latencies, 50):.3f} ms  "
+        f"p99 {np.percentile(latencies, 99):.3f} ms  "
+        f"max {latencies.max():.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--idle", type=float, default=5.0)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.02)
+    args = parser.parse_args()
+
+    for mode in ("poll", "event"):
+        run(mode, args.idle, args.frames, args.interval)
@@ -0,0 +1,146 @@
+import math
+
+import cv2
+import numpy as np
+
+# feature search and Lucas-Kanade parameters for propagate()
+_LK = dict(
+    winSize=(15, 15),
+    maxLevel=2,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03),
+)
+
+
+class BoxFlow:
+    """Moves tracked boxes between detections with sparse optical flow.
+
+    reset() takes the frame the detector ran on and its tracked boxes as
+    rows of x1, y1, x2, y2, track id, conf, class in pixels. propagate()
+    follows corner points inside each box into the next frame with
+    pyramidal Lucas-Kanade and moves and scales the box by the median
+    motion of its points. Boxes that lose too many points are dropped, the
+    next detection picks them up again.
+    """
+
+    def __init__(self, max_points=20, min_points=4) -> None:
+        self.max_points = max_points
+        self.min_points = min_points
+        self.gray = None
+        self.boxes = np.empty((0, 7), dtype=np.float32)
+        self.points = []
+
+    def _seed(self, box):
+        h, w = self.gray.shape
+        x1, y1, x2, y2 = (int(v) for v in box[:4])
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, w), min(y2, h)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return np.empty((0, 1, 2), dtype=np.float32)
+
+        points = cv2.goodFeaturesToTrack(
+            self.gray[y1:y2, x1:x2], self.max_points, 0.01, 2
+        )
+        if points is None or len(points) < self.min_points:
+            # small or flat targets have few corners, use a grid instead
+            xs, ys = np.meshgrid(np.linspace(x1, x2 - 1, 4), np.linspace(y1, y2 - 1, 4))
+            return np.stack([xs, ys], -1).reshape(-1, 1, 2).astype(np.float32)
+        return points + np.array([x1, y1], dtype=np.float32)
+
+    def reset(self, frame, boxes):
+        self.gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.boxes = np.array(boxes, dtype=np.float32).reshape(-1, 7)
+        self.points = [self._seed(box) for box in self.boxes]
+
+    def propagate(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if not len(self.boxes):
+            self.gray = gray
+            return self.boxes
+
+        counts = [len(p) for p in self.points]
+        p0 = np.concatenate(self.points)
+        p1, status, _ = cv2.calcOpticalFlowPyrLK(self.gray, gray, p0, None, **_LK)
+        self.gray = gray
+
+        keep = []
+        points = []
+        start = 0
+        for i, n in enumerate(counts):
+            good = status[start : start + n, 0] == 1
+            old = p0[start : start + n][good].reshape(-1, 2)
+            new = p1[start : start + n][good].reshape(-1, 2)
+            start += n
+            if len(new) < self.min_points:
+                continue
+
+            box = self.boxes[i]
+            shift = np.median(new - old, axis=0)
+            # spread of the points around their centre gives the scale change
+            old_spread = np.median(np.linalg.norm(old - old.mean(0), axis=1))
+            new_spread = np.median(np.linalg.norm(new - new.mean(0), axis=1))
+            scale = new_spread / old_spread if old_spread > 1 else 1.0
+            scale = min(max(scale, 0.8), 1.25)
+
+            centre = (box[:2] + box[2:4]) / 2 + shift
+            half = (box[2:4] - box[:2]) / 2 * scale
+            box[:2] = centre - half
+            box[2:4] = centre + half
+            keep.append(i)
+            points.append(new.reshape(-1, 1, 2))
+
+        self.boxes = self.boxes[keep]
+        self.points = points
+        return self.boxes
+
+
+class DetectSchedule:
+    """Decides which frames go through the detector.
+
+    With a fixed every, the detector runs on every k-th frame. With every
+    None, k adapts so the average cost per frame, one detection and k - 1
+    flow updates, stays within budget of the camera's frame period.
+    """
+
+    def __init__(self, every=None, max_every=10, budget=0.8, smoothing=0.9) -> None:
+        self.every = every
+        self.max_every = max_every
+        self.budget = budget
+        self.smoothing = smoothing
+        self.k = every or 1
+        self.since = self.k
+        self.detect_time = None
+        self.flow_time = 0.0
+        self.period = None
+
+    def _average(self, old, new):
+        if old is None:
+            return new
+        return self.smoothing * old + (1 - self.smoothing) * new
+
+    def frame_rate(self, fps):
+        # the camera's, frames skipped while busy do not count
+        if fps > 0:
+            self.period = 1 / fps
+
+    def due(self):
+        return self.since >= self.k
+
+    def detected(self, seconds):
+        self.detect_time = self._average(self.detect_time, seconds)
+        self.since = 1
+        self._adapt()
+
+    def propagated(self, seconds):
+        self.flow_time = self._average(self.flow_time, seconds)
+        self.since += 1
+
+    def _adapt(self):
+        if self.every is not None or self.period is None:
+            return
+        # (detect + (k - 1) * flow) / k <= budget * period
+        spare = self.budget * self.period - self.flow_time
+        if spare <= 0:
+            self.k = self.max_every
+            return
+        k = math.ceil((self.detect_time - self.flow_time) / spare)
+        self.k = min(max(k, 1), self.max_every)
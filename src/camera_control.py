@@ -1,6 +1,12 @@
+import asyncio
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPDigestAuth
 
 
@@ -28,17 +34,33 @@ class PtzControl:
         self.home_endpoint = (
             f"http://{camera_ip}:{camera_port}/ISAPI/PTZCtrl/channels/1/homePosition"
         )
+        self.status_endpoint = (
+            f"http://{camera_ip}:{camera_port}/ISAPI/PTZCtrl/channels/1/status"
+        )
+
+        # HTTPDigestAuth keeps the last nonce and nonce count, so after the first
+        # 401 every request is signed up front. The session keeps the TCP
+        # connection open between commands.
         self.auth = HTTPDigestAuth(camera_user, camera_pass)
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        self.session.mount(
+            "http://", HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+        )
 
-    def send_xml(self, xml_data, endpoint, request=requests.put):
+    def close(self):
+        self.session.close()
+
+    def send_xml(self, xml_data, endpoint, method="PUT"):
         if xml_data is not None:
             headers = {"Content-Type": "application/xml"}
+            xml_data = xml_data.encode()
         else:
             headers = {}
 
         try:
-            response = request(
-                endpoint, headers=headers, data=xml_data, auth=self.auth, timeout=0.25
+            response = self.session.request(
+                method, endpoint, headers=headers, data=xml_data, timeout=0.25
             )
 
             if response.status_code == 200:
@@ -119,6 +141,34 @@ class PtzControl:
 
         return self.send_xml(xml_payload, self.continuous_endpoint)
 
+    def status(self):
+        # (response, (pan_degrees, tilt_degrees, zoom_level) or None)
+        try:
+            response = self.session.get(self.status_endpoint, timeout=0.25)
+            if response.status_code != 200:
+                return PtzResponse.OTHER, None
+
+            values = {}
+            for element in ET.fromstring(response.content).iter():
+                # drop the {namespace} prefix
+                values[element.tag.rsplit("}", 1)[-1]] = element.text
+
+            position = (
+                float(values["azimuth"]) / 10,
+                float(values["elevation"]) / 10,
+                float(values["absoluteZoom"]) / 10,
+            )
+            return PtzResponse.OK, position
+
+        except requests.exceptions.Timeout:
+            return PtzResponse.TIMEOUT, None
+        except requests.exceptions.ConnectionError:
+            return PtzResponse.CONNECTION, None
+        except requests.exceptions.RequestException:
+            return PtzResponse.REQUEST, None
+        except Exception:
+            return PtzResponse.OTHER, None
+
     def set_home(self):
         return self.send_xml(None, self.home_endpoint)
 
@@ -126,4 +176,77 @@ class PtzControl:
         return self.send_xml(None, f"{self.home_endpoint}/goto")
 
     def clear_home(self):
-        return self.send_xml(None, self.home_endpoint, requests.delete)
+        return self.send_xml(None, self.home_endpoint, "DELETE")
+
+
+class AsyncPtzControl:
+    """Non-blocking front end for PtzControl.
+
+    Commands are queued and sent one at a time from run() by a single worker
+    thread, so callers never wait for the camera. While a request is in flight
+    a newer continuous command replaces the continuous command waiting at the
+    end of the queue (only the latest velocity matters). Absolute moves and
+    other commands are never dropped and keep their order.
+    """
+
+    def __init__(self, cam, on_sent=None) -> None:
+        self.cam = cam
+        # called with the response after each request
+        self.on_sent = on_sent
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.coalesced = 0
+        self.sent = 0
+        # age of each command (time.monotonic() based) when its request went out
+        self.command_ages = deque(maxlen=1000)
+        self.closing = False
+
+    def submit(self, func, *args, issued=None):
+        issued = time.monotonic() if issued is None else issued
+        self.pending.append((func, args, issued))
+        self.wakeup.set()
+
+    def continuous(self, pan, tilt, zoom, issued=None):
+        if self.pending and self.pending[-1][0] == self.cam.continuous:
+            issued = time.monotonic() if issued is None else issued
+            self.pending[-1] = (self.cam.continuous, (pan, tilt, zoom), issued)
+            self.coalesced += 1
+        else:
+            self.submit(self.cam.continuous, pan, tilt, zoom, issued=issued)
+
+    def absolute(self, pan_degrees, tilt_degrees, zoom_level, issued=None):
+        self.submit(
+            self.cam.absolute, pan_degrees, tilt_degrees, zoom_level, issued=issued
+        )
+
+    def stop(self):
+        self.continuous(0, 0, 0)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            if not self.pending:
+                if self.closing:
+                    break
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            func, args, issued = self.pending.popleft()
+            self.command_ages.append(time.monotonic() - issued)
+            resp = await loop.run_in_executor(self.executor, func, *args)
+            self.sent += 1
+            if self.on_sent is not None:
+                self.on_sent(resp)
+            if resp != PtzResponse.OK:
+                print(resp)
+
+    async def close(self, task):
+        # let the queued commands go out, then stop run()
+        self.closing = True
+        self.wakeup.set()
+        await task
+        self.executor.shutdown()
+        self.cam.close()
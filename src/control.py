@@ -1,52 +1,90 @@
-from camera_control import PtzControl, PtzResponse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 
-def control(cmd_q):
-    cam = PtzControl("admin", "1plus2jest3")
-    manual = False
+from camera_control import AsyncPtzControl, PtzControl
+from ptz_commands import Command, Op, Source
+from ptz_driver import PtzDriver
+from startup import FIRST_PTZ, mark, ready
+
+
+def control(
+    cmd_q, mailbox, mailbox_event, ptz_state, ptz_address, barrier=None, times=None
+):
+    asyncio.run(
+        _control(cmd_q, mailbox, mailbox_event, ptz_state, ptz_address, barrier, times)
+    )
+
+
+def execute(cam, cmd, state):
+    if cmd.op == Op.MANUAL_ON:
+        state["manual"] = True
+    elif cmd.op == Op.MANUAL_OFF:
+        state["manual"] = False
+    elif cmd.source == Source.AUTO and state["manual"]:
+        return
+    elif cmd.op == Op.CONT:
+        cam.continuous(cmd.pan, cmd.tilt, cmd.zoom, issued=cmd.ts)
+    elif cmd.op == Op.ABS:
+        cam.absolute(cmd.pan, cmd.tilt, cmd.zoom, issued=cmd.ts)
+
+
+async def _auto(cam, mailbox, mailbox_event, state):
+    while True:
+        await mailbox_event.wait_async()
+        for cmd in mailbox.take():
+            execute(cam, cmd, state)
+
+
+async def _control(
+    cmd_q, mailbox, mailbox_event, ptz_state, ptz_address, barrier, times
+):
+    ptz = AsyncPtzControl(
+        PtzControl("admin", "1plus2jest3", *ptz_address),
+        on_sent=lambda resp: mark(times, FIRST_PTZ),
+    )
+    # open the keep-alive connection and get a digest nonce before capture
+    # starts, so the first command does not pay for them. HTTPDigestAuth
+    # keeps its nonce per thread: use the thread the commands go out on
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(ptz.executor, ptz.cam.status)
+    await asyncio.to_thread(ready, barrier, "control")
+    dispatcher = asyncio.create_task(ptz.run())
+    cam = PtzDriver(ptz, PtzControl("admin", "1plus2jest3", *ptz_address), ptz_state)
+    poller = asyncio.create_task(cam.poll())
+    state = {"manual": False}
+    auto = asyncio.create_task(_auto(cam, mailbox, mailbox_event, state))
+
+    # manual commands and stop come through cmd_q as packed Commands,
+    # cmd_q.get() blocks so keep it off the event loop
+    reader = ThreadPoolExecutor(max_workers=1)
 
     while True:
-        cmd = cmd_q.get()
-        print(f"control: cmd = '{cmd}'")
+        cmd = Command.unpack(await loop.run_in_executor(reader, cmd_q.get))
+        print(f"control: {cmd.op.name} {cmd.pan} {cmd.tilt} {cmd.zoom}")
 
-        if cmd == "stop":
-            cmd_cont(cam, [0, 0, 0])
+        if cmd.op == Op.STOP:
+            auto.cancel()
+            cam.stop()
             break
 
-        cmd = cmd.split(" ")
-        sub_cmd = cmd[0]
-
-        if sub_cmd == "m":
-            sub_cmd = cmd[1]
-            if sub_cmd == "on":
-                manual = True
-            elif sub_cmd == "off":
-                manual = False
-            elif sub_cmd == "c":
-                cmd_cont(cam, cmd[2:])
-            elif sub_cmd == "a":
-                cmd_abs(cam, cmd[2:])
-        elif sub_cmd == "a" and not manual:
-            sub_cmd = cmd[1]
-            if sub_cmd == "c":
-                cmd_cont(cam, cmd[2:])
-            elif sub_cmd == "a":
-                cmd_abs(cam, cmd[2:])
-
-
-def cmd_cont(cam, vals):
-    try:
-        resp = cam.continuous(float(vals[0]), float(vals[1]), float(vals[2]))
-        if resp != PtzResponse.OK:
-            print(resp)
-    except Exception:
-        pass
-
-
-def cmd_abs(cam, vals):
-    try:
-        resp = cam.absolute(float(vals[0]), float(vals[1]), float(vals[2]))
-        if resp != PtzResponse.OK:
-            print(resp)
-    except Exception:
-        pass
+        execute(cam, cmd, state)
+
+    reader.shutdown()
+    poller.cancel()
+    cam.close()
+    await ptz.close(dispatcher)
+
+    print(
+        f"control: mailbox overwritten {mailbox.overwritten.value}, "
+        f"repeats suppressed {mailbox.suppressed.value}, "
+        f"dropped by driver {cam.dropped}"
+    )
+    if ptz.command_ages:
+        ages = np.array(ptz.command_ages) * 1000
+        print(
+            f"control: sent {ptz.sent}, coalesced {ptz.coalesced}, "
+            f"command age at dispatch p50 {np.percentile(ages, 50):.1f} ms "
+            f"p99 {np.percentile(ages, 99):.1f} ms"
+        )
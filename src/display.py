@@ -1,53 +1,314 @@
-import time
 import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import websockets
 import cv2
-import numpy as np
-from multiprocessing import shared_memory
+from annotate import BoxTable, draw, metadata
+from frame_ring import FrameRing
+from latency import DISPLAY, ENCODE, SEND
+from ptz_driver import PAN, TILT, ZOOM, MOVING, UPDATED
+from startup import ready
 from timeit import default_timer as timer
 
 
-def display(shm_name, shape, dtype, lock, stop_flag, new_frame):
-    asyncio.run(_display(shm_name, shape, dtype, lock, stop_flag, new_frame))
+def display(
+    ring_name,
+    boxes_name,
+    shape,
+    dtype,
+    stop_flag,
+    new_frame,
+    trace,
+    uri,
+    barrier=None,
+    ptz_state=None,
+    frame_fps=10,
+    meta_fps=0,
+    mode="annotated",
+    scale=1.0,
+    encoders=2,
+):
+    # frame_fps, meta_fps, mode, scale, encoders: see Camera in topology.py
+    if not frame_fps and not meta_fps:
+        raise ValueError("display needs frame_fps or meta_fps")
+    asyncio.run(
+        _display(
+            ring_name,
+            boxes_name,
+            shape,
+            dtype,
+            stop_flag,
+            new_frame,
+            trace,
+            uri,
+            barrier,
+            ptz_state,
+            frame_fps,
+            meta_fps,
+            mode,
+            scale,
+            encoders,
+        )
+    )
+
+
+def _ptz(state):
+    if state is None or not state[UPDATED]:
+        return None
+    return {
+        "pan": round(state[PAN], 2),
+        "tilt": round(state[TILT], 2),
+        "zoom": round(state[ZOOM], 2),
+        "moving": bool(state[MOVING]),
+        # seconds since the last status update
+        "age": round(time.monotonic() - state[UPDATED], 3),
+    }
+
+
+class JpegPool:
+    """JPEG encoding on worker threads for the display loop.
+
+    submit() starts on a frame of the output ring and returns a future of
+    the JPEG bytes, None if the ring slot was reused meanwhile. At most
+    workers frames are in flight, each with its own preallocated buffer for
+    the scaled frame; when full() the loop skips frames instead of queueing
+    them. cv2 releases the GIL while it resizes and encodes, so the event
+    loop is left with the I/O.
+    """
+
+    def __init__(self, shape, workers=2, quality=65, scale=1.0, trace=None):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="jpeg")
+        self.params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        self.scale = scale
+        self.trace = trace
+        size = (round(shape[1] * scale), round(shape[0] * scale))
+        self.buffers = [
+            np.empty((size[1], size[0], *shape[2:]), np.uint8) if scale != 1.0 else None
+            for _ in range(workers)
+        ]
+        self.pending = set()
+
+    def full(self):
+        return not self.buffers
+
+    async def idle(self):
+        # until a worker is free
+        if self.pending:
+            await asyncio.wait(self.pending, return_when=asyncio.FIRST_COMPLETED)
+
+    def submit(self, ring, frame_id, source_id, frame, found, names, locked, mode):
+        buffer = self.buffers.pop()
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            self._encode,
+            ring,
+            frame_id,
+            source_id,
+            frame,
+            found,
+            names,
+            locked,
+            mode,
+            buffer,
+        )
+        self.pending.add(future)
+
+        def done(_):
+            self.pending.discard(future)
+            self.buffers.append(buffer)
+
+        future.add_done_callback(done)
+        return future
 
+    def _encode(
+        self, ring, frame_id, source_id, frame, found, names, locked, mode, buffer
+    ):
+        if buffer is not None:
+            size = (buffer.shape[1], buffer.shape[0])
+            frame = cv2.resize(frame, size, dst=buffer, interpolation=cv2.INTER_AREA)
+            found = found.copy()
+            found[:, :4] *= self.scale
+        if mode == "annotated":
+            # at full size this draws on the ring slot itself
+            draw(frame, found, names, locked)
+        data = cv2.imencode(".jpg", frame, self.params)[1]
+        if not ring.valid(frame_id):
+            return None
+        if self.trace is not None:
+            self.trace.mark(source_id, ENCODE)
+        return data.tobytes()
 
-async def _display(shm_name, shape, dtype, lock, stop_flag, new_frame):
-    shm = shared_memory.SharedMemory(name=shm_name)
-    plot_array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
-    last_frame = timer()
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+async def _send(websocket, outbox, trace):
+    # sends the messages in the order they were queued, a JPEG once its
+    # encoding finished; a dropped frame takes its metadata with it
+    while True:
+        message, jpeg, source_id = await outbox.get()
+        data = None
+        if jpeg is not None:
+            try:
+                data = await jpeg
+            except Exception:
+                print("Failed to display frame")
+                continue
+            if data is None:
+                continue
+        if message is not None:
+            await websocket.send(message)
+        if data is not None:
+            await websocket.send(data)
+            trace.mark(source_id, SEND)
+
+
+async def _display(
+    ring_name,
+    boxes_name,
+    shape,
+    dtype,
+    stop_flag,
+    new_frame,
+    trace,
+    uri,
+    barrier,
+    ptz_state,
+    frame_fps,
+    meta_fps,
+    mode,
+    scale,
+    encoders,
+):
+    ring = FrameRing(ring_name, shape, dtype)
+    boxes = BoxTable(boxes_name, ring.slots)
+    pool = JpegPool(shape, encoders, scale=scale, trace=trace)
+    periods = [1 / frame_fps if frame_fps else None, 1 / meta_fps if meta_fps else None]
+    last_id = 0
+    # when the last JPEG and the last metadata message went out
+    last_sent = [timer(), timer()]
+
+    # connect before capture starts, the first frames should not wait for it
+    connection = None
+    try:
+        connection = await websockets.connect(uri, ping_interval=None)
+    except Exception:
+        pass
+    await asyncio.to_thread(ready, barrier, "display")
 
-    # uri = "ws://localhost:8080/andros/sender"
-    uri = "ws://10.66.66.1:8080/andros/sender"
     while True:
         if stop_flag.value == 1:
             break
 
         try:
-            async with websockets.connect(uri, ping_interval=None) as websocket:
-                while True:
-                    if stop_flag.value == 1:
-                        break
+            if connection is None:
+                connection = await websockets.connect(uri, ping_interval=None)
+            websocket, connection = connection, None
+            # the class names go with the first metadata of a connection
+            names_sent = False
+            # a slow connection drops metadata rather than queueing it up
+            outbox = asyncio.Queue(encoders + 2)
+            sender = asyncio.create_task(_send(websocket, outbox, trace))
+            try:
+                async with websocket:
+                    while True:
+                        if stop_flag.value == 1:
+                            break
+                        if sender.done():
+                            print("### reconnecting ###")
+                            break
 
-                    if new_frame.value == 1 and timer() - last_frame > 0.1:
-                        last_frame = timer()
+                        if ring.latest_id() <= last_id:
+                            await new_frame.wait_async(0.25)
+                            continue
+
+                        # send at most frame_fps JPEGs and meta_fps metadata
+                        # messages per second
+                        wait = min(
+                            last + period
+                            for last, period in zip(last_sent, periods)
+                            if period
+                        )
+                        wait -= timer()
+                        if wait > 0:
+                            await asyncio.sleep(wait)
+
+                        now = timer()
+                        due = [
+                            period is not None and now - last >= period
+                            for last, period in zip(last_sent, periods)
+                        ]
+                        if due[0] and (pool.full() or outbox.full()):
+                            # the encoders are behind, the next frame will do
+                            due[0] = False
+                            if not due[1]:
+                                if pool.full():
+                                    await pool.idle()
+                                else:
+                                    # the websocket is behind
+                                    await asyncio.sleep(0.005)
+                                continue
+                        if not any(due):
+                            continue
+                        send_frame = due[0]
+                        # every JPEG gets its metadata when metadata is on
+                        send_meta = periods[1] is not None and (due[1] or send_frame)
+
+                        frame_id = ring.latest_id()
+                        frame = ring.edit(frame_id) if frame_id > last_id else None
+                        if frame is None:
+                            continue
+                        last_id = frame_id
                         # print("in new frame")
-                        with lock:
-                            plot = plot_array.copy()
-                        new_frame.value = 0
-
-                        try:
-                            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 65]
-                            data = cv2.imencode(".jpg", plot, encode_param)[1]
-                            data = data.tobytes()
-                            await websocket.send(data)
-                        except websockets.exceptions.ConnectionClosed:
-                            print("### reconnecting ###")
-                            websocket = await websockets.connect(
-                                uri, ping_interval=None
+                        ring.ack(frame_id)
+                        # id of the input frame the frame was published from
+                        ts, source_id = ring.stamp(frame_id)
+                        trace.mark(source_id, DISPLAY)
+
+                        found, locked = boxes.read(frame_id)
+                        message = None
+                        names = None
+                        if send_meta:
+                            last_sent[1] = now
+                            if not names_sent:
+                                names = boxes.class_names() or None
+                            message = metadata(
+                                source_id,
+                                ts,
+                                shape,
+                                found,
+                                locked,
+                                _ptz(ptz_state),
+                                names,
+                                send_frame,
+                            )
+                        jpeg = None
+                        if send_frame:
+                            last_sent[0] = now
+                            jpeg = pool.submit(
+                                ring,
+                                frame_id,
+                                source_id,
+                                frame,
+                                found,
+                                boxes.class_names(),
+                                locked,
+                                mode,
                             )
-                        except Exception:
-                            print("Failed to display frame")
-                    else:
-                        time.sleep(0.001)
+                        elif not ring.valid(frame_id):
+                            continue
+                        if jpeg is None and outbox.full():
+                            continue
+                        outbox.put_nowait((message, jpeg, source_id))
+                        names_sent = names_sent or names is not None
+            finally:
+                # also when the loop raises, or _send would wait forever on
+                # an outbox nobody fills
+                sender.cancel()
         except Exception:
-            time.sleep(0.25)
+            await asyncio.sleep(0.25)
+
+    pool.close()
+    boxes.close()
+    ring.close()
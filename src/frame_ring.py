@@ -0,0 +1,155 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+# header layout (int64 words), followed by per slot sequence, timestamp and
+# tag words
+_SLOTS = 0
+_LATEST = 1
+_ACKED = 2
+_FIELDS = 3
+_PER_SLOT = 3
+
+
+def _header_size(slots):
+    # keep the frames cache line aligned
+    return -(-(_FIELDS + _PER_SLOT * slots) * 8 // 64) * 64
+
+
+class FrameRing:
+    """N-slot frame ring in shared memory.
+
+    The producer writes into the slot after the newest one and publishes it
+    seqlock style: the slot sequence is odd while the slot is being written
+    and 2 * frame_id once it is complete. Consumers read the newest frame in
+    place and call valid() afterwards to check that the slot was not reused
+    while they were looking at it. With N slots a consumer has N - 1 frame
+    periods to finish with a frame before it is overwritten.
+
+    Each frame carries a timestamp and a tag set by commit(): the capture
+    time.monotonic_ns() and, in a ring fed from another ring, the id of the
+    source frame. stamp() reads them back.
+
+    The producer passes the consumers' Notifiers as notify so commit() wakes
+    them up.
+    """
+
+    def __init__(self, name, shape, dtype, slots=None, notify=()):
+        frame_size = int(np.prod(shape) * np.dtype(dtype).itemsize)
+
+        if name is None:
+            size = _header_size(slots) + slots * frame_size
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.header = np.ndarray(
+                (_FIELDS + _PER_SLOT * slots,), dtype=np.int64, buffer=self.shm.buf
+            )
+            self.header[:] = 0
+            self.header[_SLOTS] = slots
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            slots = int(np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)[0])
+            self.header = np.ndarray(
+                (_FIELDS + _PER_SLOT * slots,), dtype=np.int64, buffer=self.shm.buf
+            )
+
+        self.name = self.shm.name
+        self.slots = slots
+        self.notify = list(notify)
+        self.seqs = self.header[_FIELDS : _FIELDS + slots]
+        self.stamps = self.header[_FIELDS + slots : _FIELDS + 2 * slots]
+        self.tags = self.header[_FIELDS + 2 * slots :]
+        self.frames = np.ndarray(
+            (slots, *shape),
+            dtype=dtype,
+            buffer=self.shm.buf,
+            offset=_header_size(slots),
+        )
+
+        self.views = []
+        for frame in self.frames:
+            view = frame.view()
+            view.flags.writeable = False
+            self.views.append(view)
+
+    @classmethod
+    def create(cls, shape, dtype, slots=8):
+        return cls(None, shape, dtype, slots)
+
+    def latest_id(self):
+        return int(self.header[_LATEST])
+
+    # producer side
+
+    def begin(self):
+        frame_id = self.latest_id() + 1
+        slot = frame_id % self.slots
+        self.seqs[slot] = 2 * frame_id - 1
+        return frame_id, self.frames[slot]
+
+    def commit(self, frame_id, ts=0, tag=0):
+        slot = frame_id % self.slots
+        self.stamps[slot] = ts
+        self.tags[slot] = tag
+        self.seqs[slot] = 2 * frame_id
+        self.header[_LATEST] = frame_id
+        for notifier in self.notify:
+            notifier.set()
+
+    def publish(self, frame, ts=0, tag=0):
+        frame_id, dst = self.begin()
+        np.copyto(dst, frame)
+        self.commit(frame_id, ts, tag)
+        return frame_id
+
+    def pending(self):
+        # newest frame not yet acknowledged by the consumer
+        return self.header[_ACKED] < self.header[_LATEST]
+
+    # consumer side
+
+    def latest(self, after=0):
+        frame_id = self.latest_id()
+        if frame_id <= after:
+            return 0, None
+
+        slot = frame_id % self.slots
+        if self.seqs[slot] != 2 * frame_id:
+            # the producer already moved on and is rewriting this slot
+            return 0, None
+
+        return frame_id, self.views[slot]
+
+    def get(self, frame_id):
+        # a specific frame, for consumers that want every frame still in the ring
+        if frame_id <= 0 or self.seqs[frame_id % self.slots] != 2 * frame_id:
+            return None
+        return self.views[frame_id % self.slots]
+
+    def edit(self, frame_id):
+        # writable frame, for the one consumer that draws on it in place;
+        # check valid() afterwards like after get()
+        if frame_id <= 0 or self.seqs[frame_id % self.slots] != 2 * frame_id:
+            return None
+        return self.frames[frame_id % self.slots]
+
+    def stamp(self, frame_id):
+        # (ts, tag) of the frame, check valid() afterwards
+        slot = frame_id % self.slots
+        return int(self.stamps[slot]), int(self.tags[slot])
+
+    def valid(self, frame_id):
+        return self.seqs[frame_id % self.slots] == 2 * frame_id
+
+    def ack(self, frame_id):
+        self.header[_ACKED] = frame_id
+
+    def close(self):
+        self.views = []
+        self.frames = None
+        self.header = None
+        self.seqs = None
+        self.stamps = None
+        self.tags = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
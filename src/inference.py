@@ -1,20 +1,117 @@
 import time
-from ultralytics import YOLO
+from types import SimpleNamespace
+import torch
+import yaml
+from ultralytics.engine.results import Results
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils.checks import check_yaml
 import numpy as np
-from multiprocessing import shared_memory
+from annotate import BoxTable
+from backends import load_model
+from box_flow import BoxFlow, DetectSchedule
+from frame_ring import FrameRing
+from roi import RoiSelector
+from tiles import predict_windows, tile_windows
+from latency import PICKUP, TRACK, PLOT, PTZ
+from startup import FIRST_FRAME, mark, ready
 from tracker import Tracker
+from ptz_commands import Command, Op
+
+
+def _rows(result):
+    # x1, y1, x2, y2, id, conf, class rows, id -1 for untracked boxes
+    boxes = result.boxes
+    if boxes is None or not len(boxes):
+        return np.empty((0, 7), dtype=np.float32)
+    data = boxes.data.cpu().numpy()
+    if not boxes.is_track:
+        data = np.insert(data, 4, -1, axis=1)
+    return data
+
+
+def _finish(result, frame_id, in_ring, out_ring, out_boxes, tracker, trace):
+    # everything after the model: frame and boxes for display, PTZ tracking,
+    # ack; display draws the boxes. The lock is updated first so the boxes
+    # go out with this result's locked id
+    tracker.process_boxes(result.boxes)
+    if not out_ring.pending():
+        # print("out new frame")
+        grabbed, _ = in_ring.stamp(frame_id)
+        frame = in_ring.get(frame_id)
+        if frame is not None:
+            out_id, dst = out_ring.begin()
+            np.copyto(dst, frame)
+            out_boxes.write(out_id, _rows(result), tracker.locked)
+            # drop the frame if the slot was reused while we were copying it
+            if in_ring.valid(frame_id):
+                out_ring.commit(out_id, grabbed, frame_id)
+                trace.mark(frame_id, PLOT)
+
+    posts = tracker.mailbox.posts
+    # tracker.process_gps_and_mag()
+    tracker.track()
+    if tracker.mailbox.posts != posts:
+        trace.mark(frame_id, PTZ)
+
+    # ready for the next frame
+    in_ring.ack(frame_id)
+
+
+def _byte_tracker():
+    # what model.track(persist=True) sets up, but owned by one stream
+    with open(check_yaml("bytetrack.yaml")) as f:
+        cfg = SimpleNamespace(**yaml.safe_load(f))
+    return BYTETracker(cfg, frame_rate=30)
+
+
+def _track(byte_tracker, result):
+    # same as ultralytics' on_predict_postprocess_end for a single result
+    tracks = byte_tracker.update(result.boxes.cpu().numpy(), result.orig_img)
+    if len(tracks) == 0:
+        return result
+    result = result[tracks[:, -1].astype(int)]
+    result.update(boxes=torch.as_tensor(tracks[:, :-1]))
+    return result
+
+
+def _tracked(result):
+    # x1, y1, x2, y2, id, conf, class rows of the tracked boxes
+    boxes = result.boxes
+    if boxes is None or not boxes.is_track:
+        return np.empty((0, 7), dtype=np.float32)
+    return boxes.data.cpu().numpy()
+
+
+def _detect(model, byte_tracker, frame, windows, imgsz):
+    # detection on the whole frame, or on windows of it in one batch with the
+    # boxes merged in frame pixels, tracked either way
+    if windows is None:
+        return _track(byte_tracker, model.predict(frame, verbose=False)[0])
+
+    data = predict_windows(model, frame, windows, imgsz)
+    result = Results(frame, path="", names=model.names, boxes=torch.as_tensor(data))
+    return _track(byte_tracker, result)
+
+
+def _warmup(model, frames, windows=(), runs=2):
+    # the first calls allocate and compile for each input size, get them out
+    # of the way before capture starts; windows are (windows, imgsz) pairs
+    for _ in range(runs):
+        model.predict(frames, verbose=False)
+        for batch, imgsz in windows:
+            predict_windows(model, frames[0], batch, imgsz)
 
 
 def inference(
-    in_shm_name,
-    out_shm_name,
+    in_ring_name,
+    out_ring_name,
+    out_boxes_name,
     shape,
     dtype,
-    in_lock,
-    out_lock,
+    box_orientation,
     stop_flag,
-    in_new_frame,
-    out_new_frame,
+    in_event,
+    out_notify,
     coords_lon,
     coords_lat,
     coords_new,
@@ -28,15 +125,38 @@ def inference(
     # mag_new,
     # mag_lock,
     cmd_q,
+    mailbox,
+    ptz_state,
+    trace,
+    stream_fps,
+    detect_every=1,
+    roi_size=0,
+    tile_size=0,
+    backend="auto",
+    barrier=None,
+    times=None,
 ):
-    # yolo export model=yolo11n.pt format=openvino int8=True data=coco128.yaml nms=True
-    # model = YOLO("best.pt")
-    model = YOLO("best_full_integer_quant_edgetpu.tflite")
+    # detect_every, roi_size, tile_size, backend: see Camera in topology.py
+    in_ring = FrameRing(in_ring_name, shape, dtype)
+    out_ring = FrameRing(out_ring_name, shape, dtype, notify=out_notify)
+    out_boxes = BoxTable(out_boxes_name, out_ring.slots)
+    # capture waits for us, so the backend benchmark gets a blank frame
+    model = load_model(backend, sample=lambda: np.zeros(shape, dtype))
+    out_boxes.set_names(model.names)
+    last_id = 0
+    flow = BoxFlow() if detect_every != 1 else None
+    schedule = DetectSchedule(detect_every)
+    roi = RoiSelector(roi_size) if roi_size else None
+    tiles = tile_windows(shape, tile_size) if tile_size else None
+    # model.track() would track window detections in window coordinates
+    byte_tracker = _byte_tracker() if roi or tiles else None
 
-    in_shm = shared_memory.SharedMemory(name=in_shm_name)
-    frame_array = np.ndarray(shape, dtype=dtype, buffer=in_shm.buf)
-    out_shm = shared_memory.SharedMemory(name=out_shm_name)
-    plot_array = np.ndarray(shape, dtype=dtype, buffer=out_shm.buf)
+    windows = []
+    if roi is not None:
+        windows.append(([(0, 0, roi_size, roi_size)], roi_size))
+    if tiles is not None:
+        windows.append((tiles, tile_size))
+    _warmup(model, [np.zeros(shape, dtype)], windows)
 
     tracker = Tracker(
         coords_lon,
@@ -51,30 +171,150 @@ def inference(
         mag_angle,
         # mag_new,
         # mag_lock,
-        cmd_q,
+        mailbox,
+        ptz_state,
+        box_orientation,
     )
+    ready(barrier, "inference")
 
     while True:
         if stop_flag.value == 1:
-            cmd_q.put("stop")
+            cmd_q.put(Command.new(Op.STOP).pack())
             break
 
-        if in_new_frame.value == 1:
-            with in_lock:
-                frame = frame_array.copy()
-            in_new_frame.value = 0
-            results = model.track(frame, persist=True, verbose=False)
-
-            if out_new_frame.value == 0:
-                # print("out new frame")
-                frame = results[0].plot()
-                with out_lock:
-                    np.copyto(plot_array, frame)
-                out_new_frame.value = 1
-
-            tracker.process_boxes(results[0].boxes)
-            # tracker.process_gps_and_mag()
-            tracker.track()
-
-        else:
-            time.sleep(0.001)
+        # wake up on a new frame, time out to keep an eye on stop_flag
+        if not in_event.wait(0.25):
+            continue
+
+        frame_id, frame = in_ring.latest(last_id)
+        if frame is not None:
+            last_id = frame_id
+            trace.mark(frame_id, PICKUP)
+            start = time.perf_counter()
+            if flow is None or schedule.due():
+                # the frame is read in place, the model copies it while preprocessing
+                window = roi.window(frame.shape, start) if roi else None
+                if byte_tracker is None:
+                    result = model.track(frame, persist=True, verbose=False)[0]
+                elif window is not None:
+                    result = _detect(model, byte_tracker, frame, [window], roi_size)
+                else:
+                    result = _detect(model, byte_tracker, frame, tiles, tile_size)
+                if flow is not None:
+                    flow.reset(frame, _tracked(result))
+                    schedule.frame_rate(stream_fps.value)
+                    schedule.detected(time.perf_counter() - start)
+            else:
+                boxes = flow.propagate(frame)
+                result = Results(
+                    frame, path="", names=model.names, boxes=torch.as_tensor(boxes)
+                )
+                schedule.propagated(time.perf_counter() - start)
+            trace.mark(frame_id, TRACK)
+            _finish(result, frame_id, in_ring, out_ring, out_boxes, tracker, trace)
+            mark(times, FIRST_FRAME)
+            if roi is not None:
+                roi.target(_tracked(result), tracker.locked, start)
+
+
+def inference_server(
+    streams,
+    dtype,
+    stop_flag,
+    in_event,
+    backend="auto",
+    batch_size=4,
+    gather=0.005,
+):
+    # One model for several cameras. The grabbers of all streams notify
+    # in_event; the newest unseen frame of each stream goes into a batch of at
+    # most batch_size frames, waiting up to gather seconds for the other
+    # streams to deliver. The model has to accept that batch size, export it
+    # with batch=batch_size or dynamic=True. Frame shapes may differ between
+    # streams, the model letterboxes each one to its input size.
+    in_rings = []
+    out_rings = []
+    out_boxes = []
+    trackers = []
+    byte_trackers = []
+    for stream in streams:
+        in_rings.append(FrameRing(stream.in_ring_name, stream.shape, dtype))
+        out_rings.append(
+            FrameRing(
+                stream.out_ring_name, stream.shape, dtype, notify=stream.out_notify
+            )
+        )
+        out_boxes.append(BoxTable(stream.out_boxes_name, out_rings[-1].slots))
+        trackers.append(Tracker(*stream.tracker_args, stream.box_orientation))
+        # persist=True in model.track keeps one tracker for the whole batch,
+        # every stream needs its own
+        byte_trackers.append(_byte_tracker())
+    model = load_model(backend, sample=lambda: np.zeros(streams[0].shape, dtype))
+    for boxes in out_boxes:
+        boxes.set_names(model.names)
+    _warmup(model, [np.zeros(stream.shape, dtype) for stream in streams[:batch_size]])
+    for stream in streams:
+        ready(stream.barrier, "inference")
+    last_ids = [0] * len(streams)
+    # round robin start, so with more streams than batch_size none starves
+    first = 0
+    full = False
+
+    def collect(batch):
+        nonlocal first
+        taken = {i for i, _, _ in batch}
+        for n in range(len(streams)):
+            if len(batch) == batch_size:
+                break
+            i = (first + n) % len(streams)
+            if i in taken:
+                continue
+            frame_id, frame = in_rings[i].latest(last_ids[i])
+            if frame is not None:
+                batch.append((i, frame_id, frame))
+        if batch:
+            first = (batch[-1][0] + 1) % len(streams)
+        return batch
+
+    while True:
+        if stop_flag.value == 1:
+            for stream in streams:
+                stream.cmd_q.put(Command.new(Op.STOP).pack())
+            break
+
+        # a full batch may have left frames behind, look again without waiting
+        if not full and not in_event.wait(0.25):
+            continue
+
+        batch = collect([])
+        if not batch:
+            full = False
+            continue
+        if len(batch) < min(batch_size, len(streams)) and gather:
+            deadline = time.monotonic() + gather
+            while len(batch) < min(batch_size, len(streams)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not in_event.wait(remaining):
+                    break
+                collect(batch)
+        full = len(batch) == batch_size
+
+        for i, frame_id, _ in batch:
+            last_ids[i] = frame_id
+            streams[i].trace.mark(frame_id, PICKUP)
+
+        results = model.predict([frame for _, _, frame in batch], verbose=False)
+
+        for (i, frame_id, _), result in zip(batch, results):
+            result = _track(byte_trackers[i], result)
+            streams[i].trace.mark(frame_id, TRACK)
+            _finish(
+                result,
+                frame_id,
+                in_rings[i],
+                out_rings[i],
+                out_boxes[i],
+                trackers[i],
+                streams[i].trace,
+            )
+            mark(streams[i].times, FIRST_FRAME)
@@ -0,0 +1,157 @@
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal stand-in for the camera's ISAPI PTZ endpoints with digest auth,
+# enough to exercise PtzControl without hardware.
+#
+#   python isapi_mock.py --port 8000 --latency 0.005
+
+REALM = "IP Camera"
+PTZ_PREFIX = "/ISAPI/PTZCtrl/channels/1/"
+
+
+def _md5(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+class IsapiHandler(BaseHTTPRequestHandler):
+    # keep-alive, like the camera
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=b"", headers=()):
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _challenge(self, stale=False):
+        self.server.count("challenges")
+        nonce = self.server.new_nonce()
+        header = f'Digest realm="{REALM}", qop="auth", nonce="{nonce}"'
+        if stale:
+            header += ", stale=TRUE"
+        self._reply(401, headers=[("WWW-Authenticate", header)])
+
+    def _authorized(self):
+        header = self.headers.get("Authorization", "")
+        if not header.startswith("Digest "):
+            self._challenge()
+            return False
+
+        fields = dict(re.findall(r'(\w+)="?([^",]*)"?', header[7:]))
+        nonce = fields.get("nonce")
+        if not self.server.nonce_valid(nonce):
+            self._challenge(stale=True)
+            return False
+
+        ha1 = _md5(f"{self.server.user}:{REALM}:{self.server.password}")
+        ha2 = _md5(f"{self.command}:{fields.get('uri')}")
+        expected = _md5(
+            f"{ha1}:{nonce}:{fields.get('nc')}:{fields.get('cnonce')}:"
+            f"{fields.get('qop')}:{ha2}"
+        )
+        if fields.get("response") != expected:
+            self._challenge()
+            return False
+
+        return True
+
+    def _latency(self):
+        return self.server.latency
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+
+        if not self._authorized():
+            return
+
+        delay = self._latency()
+        if delay:
+            time.sleep(delay)
+
+        if not self.path.startswith(PTZ_PREFIX):
+            self._reply(404)
+            return
+
+        self.server.count("commands")
+        status, reply = self.server.command(
+            self.command, self.path[len(PTZ_PREFIX) :], body
+        )
+        self._reply(status, reply, [("Content-Type", "application/xml")])
+
+    do_GET = _handle
+    do_PUT = _handle
+    do_DELETE = _handle
+
+
+class IsapiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        user="admin",
+        password="1plus2jest3",
+        latency=0.0,
+        nonce_lifetime=30.0,
+        handler=IsapiHandler,
+    ):
+        super().__init__(address, handler)
+        self.user = user
+        self.password = password
+        self.latency = latency
+        self.nonce_lifetime = nonce_lifetime
+        self.nonces = {}
+        self.stats = {"connections": 0, "challenges": 0, "commands": 0}
+        self.lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        self.count("connections")
+        super().process_request(request, client_address)
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def new_nonce(self):
+        nonce = os.urandom(16).hex()
+        now = time.monotonic()
+        with self.lock:
+            for old, issued in list(self.nonces.items()):
+                if now - issued >= self.nonce_lifetime:
+                    del self.nonces[old]
+            self.nonces[nonce] = now
+        return nonce
+
+    def nonce_valid(self, nonce):
+        with self.lock:
+            issued = self.nonces.get(nonce)
+        return issued is not None and time.monotonic() - issued < self.nonce_lifetime
+
+    def command(self, method, path, body):
+        # accept everything, subclasses model the camera
+        return 200, b'<?xml version="1.0" encoding="UTF-8"?><ResponseStatus/>'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = IsapiServer((args.host, args.port), latency=args.latency)
+    print(f"ISAPI mock on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,93 @@
+import time
+from multiprocessing import Array
+
+import numpy as np
+
+# stage columns, in pipeline order; column 0 of a row holds the frame id
+GRAB = 1  # cap.grab() returned, the frame is decoded
+RETRIEVE = 2  # cap.retrieve() returned
+PUBLISH = 3  # oriented frame committed to the input ring
+PICKUP = 4  # inference took the frame
+TRACK = 5  # model.track() returned
+PLOT = 6  # frame and boxes committed to the output ring
+DISPLAY = 7  # display took the frame
+ENCODE = 8  # boxes drawn and JPEG encoded
+SEND = 9  # websocket.send() returned
+PTZ = 10  # tracker posted a PTZ command for the frame
+_COLUMNS = 11
+
+SPANS = [
+    ("retrieve", GRAB, RETRIEVE),
+    ("orient+copy", RETRIEVE, PUBLISH),
+    ("inference wait", PUBLISH, PICKUP),
+    ("model.track", PICKUP, TRACK),
+    ("publish", TRACK, PLOT),
+    ("display wait", PLOT, DISPLAY),
+    ("draw+encode", DISPLAY, ENCODE),
+    ("send", ENCODE, SEND),
+    ("track->ptz", TRACK, PTZ),
+    ("capture->send", GRAB, SEND),
+    ("capture->ptz", GRAB, PTZ),
+]
+
+# histogram bucket upper edges in ms
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+class LatencyTrace:
+    """Per-frame stage timestamps shared between the pipeline processes.
+
+    Frame ids are the input ring's. The grabber starts a row for every frame
+    it publishes, later stages mark their column if the row still belongs to
+    that frame. Timestamps are time.monotonic_ns(), which is system wide.
+    The table keeps the last rows frames; report() summarizes them. Create it
+    in the parent before forking.
+    """
+
+    def __init__(self, rows=1024) -> None:
+        self.rows = rows
+        self.table = Array("q", rows * _COLUMNS, lock=False)
+
+    def start(self, frame_id, grabbed):
+        base = frame_id % self.rows * _COLUMNS
+        self.table[base + 1 : base + _COLUMNS] = [0] * (_COLUMNS - 1)
+        self.table[base + GRAB] = grabbed
+        self.table[base] = frame_id
+
+    def mark(self, frame_id, stage, ts=None):
+        base = frame_id % self.rows * _COLUMNS
+        if self.table[base] == frame_id:
+            self.table[base + stage] = time.monotonic_ns() if ts is None else ts
+
+    def spans(self):
+        table = np.frombuffer(self.table, dtype=np.int64).reshape(self.rows, _COLUMNS)
+        table = table[table[:, 0] > 0]
+        spans = {}
+        for name, begin, end in SPANS:
+            done = (table[:, begin] > 0) & (table[:, end] >= table[:, begin])
+            spans[name] = (table[done, end] - table[done, begin]) / 1e6
+        return spans
+
+    def rate(self, stage, window=5.0):
+        # frames per second that reached stage over the last window seconds
+        table = np.frombuffer(self.table, dtype=np.int64).reshape(self.rows, _COLUMNS)
+        since = time.monotonic_ns() - int(window * 1e9)
+        return np.count_nonzero(table[:, stage] > since) / window
+
+    def report(self):
+        lines = [
+            f"{'':>15} {'n':>5} {'p50':>7} {'p90':>7} {'p99':>7} {'max':>7}  "
+            + " ".join(f"<{b:<4}" for b in BUCKETS)
+            + " more"
+        ]
+        for name, ms in self.spans().items():
+            if not len(ms):
+                lines.append(f"{name:>15} {0:>5}")
+                continue
+            p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+            counts = np.histogram(ms, [0, *BUCKETS, np.inf])[0]
+            lines.append(
+                f"{name:>15} {len(ms):>5} {p50:>7.1f} {p90:>7.1f} {p99:>7.1f} "
+                f"{ms.max():>7.1f}  " + " ".join(f"{c:>5}" for c in counts)
+            )
+        return "\n".join(lines)
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import select
+
+
+class Notifier:
+    """Wakeup primitive backed by a Linux eventfd.
+
+    Create it in the parent before the processes are forked so both sides
+    share the descriptor. set() never blocks; several set() calls before the
+    consumer wakes up collapse into one wakeup, which is what we want for
+    "a new frame is ready". Use one Notifier per consumer.
+    """
+
+    def __init__(self):
+        self.fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+
+    def fileno(self):
+        return self.fd
+
+    def set(self):
+        try:
+            os.eventfd_write(self.fd, 1)
+        except BlockingIOError:
+            # counter saturated, the consumer is going to wake up anyway
+            pass
+
+    def clear(self):
+        try:
+            os.eventfd_read(self.fd)
+            return True
+        except BlockingIOError:
+            return False
+
+    def wait(self, timeout=None):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        return bool(ready) and self.clear()
+
+    async def wait_async(self, timeout=None):
+        if self.clear():
+            return True
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        loop.add_reader(self.fd, lambda: fut.done() or fut.set_result(None))
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(self.fd)
+
+        return self.clear()
+
+    def close(self):
+        os.close(self.fd)
@@ -0,0 +1,28 @@
+import cv2
+import numpy as np
+
+ORIENTATIONS = ("none", "rot180", "hflip", "vflip")
+
+_FLIP_CODES = {"rot180": -1, "hflip": 1, "vflip": 0}
+
+
+def orient_frame(frame, dst, orientation):
+    # one pass straight into the destination, no negative strided views
+    if frame.shape != dst.shape:
+        raise ValueError(f"frame shape {frame.shape} != buffer shape {dst.shape}")
+
+    if orientation == "none":
+        np.copyto(dst, frame)
+    else:
+        cv2.flip(frame, _FLIP_CODES[orientation], dst=dst)
+
+
+def orient_boxes(xywhn, orientation):
+    # Boxes caches xywhn and .cpu() of a CPU tensor is the same object, so
+    # work on a copy to leave the Results' boxes alone
+    xywhn = xywhn.clone() if hasattr(xywhn, "clone") else xywhn.copy()
+    if orientation in ("rot180", "hflip"):
+        xywhn[:, 0] = 1 - xywhn[:, 0]
+    if orientation in ("rot180", "vflip"):
+        xywhn[:, 1] = 1 - xywhn[:, 1]
+    return xywhn
@@ -0,0 +1,84 @@
+class PanTiltController:
+    """PID velocity controller that keeps the locked box in the frame centre.
+
+    update() takes the normalized box centre and returns continuous pan/tilt
+    speeds for the camera (-100..100). Offsets inside the deadband count as
+    centred. The output can be smoothed with an exponential moving average
+    (off by default, the lag costs more than the noise it removes) and is
+    rounded to multiples of step, so it only changes when the change matters
+    and the repeats get suppressed by the command mailbox. The defaults come
+    from bench_control.py.
+
+    pan_sign and tilt_sign map image offsets to camera directions; the
+    defaults match the upside-down mounted camera.
+    """
+
+    def __init__(
+        self,
+        kp=150.0,
+        ki=40.0,
+        kd=5.0,
+        deadband=0.03,
+        smoothing=0.0,
+        step=10,
+        min_speed=10,
+        max_speed=100,
+        pan_sign=-1,
+        tilt_sign=1,
+    ) -> None:
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.deadband = deadband
+        self.smoothing = smoothing
+        self.step = step
+        self.min_speed = min_speed
+        self.max_speed = max_speed
+        self.signs = (pan_sign, tilt_sign)
+        self.reset()
+
+    def reset(self):
+        self.last_time = None
+        self.integral = [0.0, 0.0]
+        self.last_error = [0.0, 0.0]
+        self.output = [0.0, 0.0]
+
+    def _axis(self, i, offset, dt):
+        if abs(offset) < self.deadband:
+            error = 0.0
+            self.integral[i] = 0.0
+        else:
+            # measure from the deadband edge so the output starts near zero
+            error = offset - self.deadband if offset > 0 else offset + self.deadband
+
+        derivative = 0.0
+        integral = self.integral[i]
+        if dt > 0:
+            # anti-windup: the integral term alone never exceeds max_speed
+            limit = self.max_speed / self.ki if self.ki else 0.0
+            integral = max(-limit, min(limit, integral + error * dt))
+            derivative = (error - self.last_error[i]) / dt
+        self.last_error[i] = error
+
+        raw = self.kp * error + self.ki * integral + self.kd * derivative
+        # and it is frozen while the output is saturated, unless it unwinds
+        if abs(raw) <= self.max_speed or abs(integral) < abs(self.integral[i]):
+            self.integral[i] = integral
+        raw = max(-self.max_speed, min(self.max_speed, self.signs[i] * raw))
+
+        if error == 0.0:
+            # stop right away instead of coasting through the smoothing
+            self.output[i] = 0.0
+        else:
+            a = self.smoothing
+            self.output[i] = a * self.output[i] + (1 - a) * raw
+
+        speed = int(round(self.output[i] / self.step)) * self.step
+        if abs(speed) < self.min_speed:
+            return 0
+        return speed
+
+    def update(self, x, y, now):
+        dt = 0.0 if self.last_time is None else now - self.last_time
+        self.last_time = now
+        return self._axis(0, x - 0.5, dt), self._axis(1, y - 0.5, dt)
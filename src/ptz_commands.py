@@ -0,0 +1,68 @@
+import struct
+import time
+from enum import IntEnum
+from typing import NamedTuple
+
+
+class Op(IntEnum):
+    STOP = 0
+    CONT = 1
+    ABS = 2
+    MANUAL_ON = 3
+    MANUAL_OFF = 4
+
+
+class Source(IntEnum):
+    MANUAL = 0
+    AUTO = 1
+
+
+# op, source, pan, tilt, zoom, time.monotonic() when the command was issued
+_PACKED = struct.Struct("<BB6xdddd")
+
+
+class Command(NamedTuple):
+    op: Op
+    source: Source = Source.AUTO
+    pan: float = 0.0
+    tilt: float = 0.0
+    zoom: float = 0.0
+    ts: float = 0.0
+
+    @classmethod
+    def new(cls, op, source=Source.AUTO, pan=0.0, tilt=0.0, zoom=0.0):
+        return cls(op, source, pan, tilt, zoom, time.monotonic())
+
+    @classmethod
+    def unpack(cls, data):
+        op, source, pan, tilt, zoom, ts = _PACKED.unpack(data)
+        return cls(Op(op), Source(source), pan, tilt, zoom, ts)
+
+    def pack(self):
+        return _PACKED.pack(
+            self.op, self.source, self.pan, self.tilt, self.zoom, self.ts
+        )
+
+    def age(self):
+        # CLOCK_MONOTONIC is system wide, so this works across processes
+        return time.monotonic() - self.ts
+
+
+def parse(text):
+    # console syntax: "m on", "m off", "m c|a pan tilt zoom", "a c|a pan tilt zoom"
+    # and "stop". Raises ValueError on anything else.
+    words = text.split()
+    if words == ["stop"]:
+        return Command.new(Op.STOP, Source.MANUAL)
+
+    if len(words) == 2 and words[0] == "m" and words[1] in ("on", "off"):
+        op = Op.MANUAL_ON if words[1] == "on" else Op.MANUAL_OFF
+        return Command.new(op, Source.MANUAL)
+
+    if len(words) == 5 and words[0] in ("m", "a") and words[1] in ("c", "a"):
+        source = Source.MANUAL if words[0] == "m" else Source.AUTO
+        op = Op.CONT if words[1] == "c" else Op.ABS
+        pan, tilt, zoom = (float(v) for v in words[2:])
+        return Command.new(op, source, pan, tilt, zoom)
+
+    raise ValueError(f"unknown command '{text}'")
@@ -0,0 +1,173 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Array
+
+# indices into the shared state array
+PAN = 0
+TILT = 1
+ZOOM = 2
+MOVING = 3
+# time.monotonic() of the last status update, 0 if the camera never answered
+UPDATED = 4
+# issue time of the last absolute move that finished or was abandoned
+DONE_TS = 5
+STATE_SIZE = 6
+
+
+def new_state():
+    return Array("d", STATE_SIZE, lock=False)
+
+
+def _angle_diff(a, b):
+    return (a - b + 180) % 360 - 180
+
+
+class PtzDriver:
+    """Cached model of the camera on top of AsyncPtzControl.
+
+    poll() keeps pan, tilt, zoom and whether the camera is moving up to date
+    from the ISAPI status endpoint and mirrors them into the shared state
+    array. Commands that would not change anything (the velocity the camera
+    is already moving at, an absolute move to where it already is) are
+    dropped. When an absolute move reaches its target, or the camera stops
+    short of it, its issue time is written to state[DONE_TS] so the tracker
+    can tell its move has finished.
+    """
+
+    def __init__(
+        self,
+        cam,
+        status_cam,
+        state,
+        poll_interval=0.2,
+        tolerance=0.5,
+        resend_after=2.0,
+        settle_time=1.0,
+        move_timeout=10.0,
+    ) -> None:
+        self.cam = cam
+        # separate PtzControl so polling never waits behind commands
+        self.status_cam = status_cam
+        self.state = state
+        self.poll_interval = poll_interval
+        self.tolerance = tolerance
+        self.resend_after = resend_after
+        self.settle_time = settle_time
+        self.move_timeout = move_timeout
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+        self.position = None
+        self.moving = False
+        self.velocity = None
+        self.velocity_time = 0.0
+        self.target = None
+        self.target_ts = 0.0
+        self.target_time = 0.0
+        self.dropped = 0
+
+    def _close_to(self, target):
+        if self.position is None:
+            return False
+        pan, tilt, zoom = self.position
+        return (
+            abs(_angle_diff(pan, target[0])) <= self.tolerance
+            and abs(tilt - target[1]) <= self.tolerance
+            and abs(zoom - target[2]) <= self.tolerance
+        )
+
+    def _move_done(self, ts):
+        self.target = None
+        self.state[DONE_TS] = max(self.state[DONE_TS], ts)
+
+    def continuous(self, pan, tilt, zoom, issued=None):
+        now = time.monotonic()
+        velocity = (pan, tilt, zoom)
+        if velocity == self.velocity and now - self.velocity_time < self.resend_after:
+            self.dropped += 1
+            return
+
+        self.velocity = velocity
+        self.velocity_time = now
+        if self.target is not None:
+            # a continuous move abandons the absolute one
+            self._move_done(self.target_ts)
+        self.cam.continuous(pan, tilt, zoom, issued=issued)
+
+    def absolute(self, pan_degrees, tilt_degrees, zoom_level, issued=None):
+        now = time.monotonic()
+        issued = now if issued is None else issued
+        target = (pan_degrees % 360, tilt_degrees, zoom_level)
+
+        if (
+            self.target is None
+            and not self.moving
+            and self.velocity in (None, (0, 0, 0))
+            and self._close_to(target)
+        ):
+            self.dropped += 1
+            self._move_done(issued)
+            return
+
+        self.target = target
+        self.target_ts = issued
+        self.target_time = now
+        # the camera stops any continuous move when it gets an absolute one
+        self.velocity = (0, 0, 0)
+        self.velocity_time = now
+        self.cam.absolute(pan_degrees, tilt_degrees, zoom_level, issued=issued)
+
+    def stop(self):
+        self.continuous(0, 0, 0)
+
+    def _update(self, position):
+        now = time.monotonic()
+        if self.position is not None:
+            pan, tilt, zoom = self.position
+            delta = max(
+                abs(_angle_diff(position[0], pan)),
+                abs(position[1] - tilt),
+                abs(position[2] - zoom),
+            )
+            self.moving = delta > 0.05
+        self.position = position
+
+        self.state[PAN], self.state[TILT], self.state[ZOOM] = position
+        self.state[MOVING] = self.moving
+        self.state[UPDATED] = now
+
+        if self.target is not None:
+            if self._close_to(self.target):
+                self._move_done(self.target_ts)
+            elif not self.moving and now - self.target_time > self.settle_time:
+                # stopped short, e.g. at a tilt limit
+                self._move_done(self.target_ts)
+
+        if (
+            self.velocity not in (None, (0, 0, 0))
+            and not self.moving
+            and now - self.velocity_time > self.settle_time
+        ):
+            # should be moving but is not, resend the next continuous command
+            self.velocity = None
+
+    async def poll(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, position = await loop.run_in_executor(
+                self.executor, self.status_cam.status
+            )
+            if position is not None:
+                self._update(position)
+
+            if (
+                self.target is not None
+                and time.monotonic() - self.target_time > self.move_timeout
+            ):
+                self._move_done(self.target_ts)
+
+            await asyncio.sleep(self.poll_interval)
+
+    def close(self):
+        self.executor.shutdown()
+        self.status_cam.close()
@@ -0,0 +1,85 @@
+from multiprocessing import Array, Value
+
+from ptz_commands import Command, Op, Source
+
+# one latest-value slot per lane
+_LANES = {Op.CONT: 0, Op.ABS: 1}
+_OPS = list(_LANES)
+
+# per lane values: pan, tilt, zoom, issue time, order of the post across lanes
+_FIELDS = 5
+
+
+class CommandMailbox:
+    """Latest-value PTZ command slots shared between Tracker and control.
+
+    One slot per lane (continuous, absolute). post() never blocks: it
+    overwrites whatever the control process has not picked up yet and counts
+    it in overwritten. The same command posted again within repeat_interval
+    is not posted at all, the camera is already executing it.
+
+    Each slot is published seqlock style (odd sequence while writing), there
+    is a single writer per mailbox. Create it in the parent before forking.
+    """
+
+    def __init__(self, notify=None, repeat_interval=1.0):
+        self.values = Array("d", len(_LANES) * _FIELDS, lock=False)
+        self.seqs = Array("q", len(_LANES), lock=False)
+        self.taken = Array("q", len(_LANES), lock=False)
+        self.overwritten = Value("q", 0, lock=False)
+        self.suppressed = Value("q", 0, lock=False)
+        self.notify = notify
+        self.repeat_interval = repeat_interval
+
+        # writer side only
+        self.posts = 0
+        self.last = [None] * len(_LANES)
+        self.last_time = [0.0] * len(_LANES)
+
+    def post(self, cmd):
+        lane = _LANES[cmd.op]
+        key = (cmd.pan, cmd.tilt, cmd.zoom)
+        if (
+            key == self.last[lane]
+            and cmd.ts - self.last_time[lane] < self.repeat_interval
+        ):
+            self.suppressed.value += 1
+            return False
+        # a command on one lane cancels what the other lane was doing
+        self.last = [None] * len(_LANES)
+        self.last[lane] = key
+        self.last_time[lane] = cmd.ts
+
+        seq = self.seqs[lane]
+        if seq != self.taken[lane]:
+            self.overwritten.value += 1
+
+        self.posts += 1
+        base = lane * _FIELDS
+        self.seqs[lane] = seq + 1
+        self.values[base : base + _FIELDS] = [*key, cmd.ts, self.posts]
+        self.seqs[lane] = seq + 2
+
+        if self.notify is not None:
+            self.notify.set()
+        return True
+
+    def take(self):
+        # new commands in the order they were posted
+        cmds = []
+        for lane, op in enumerate(_OPS):
+            base = lane * _FIELDS
+            while True:
+                seq = self.seqs[lane]
+                if seq == self.taken[lane]:
+                    break
+                if seq % 2:
+                    continue
+                pan, tilt, zoom, ts, order = self.values[base : base + _FIELDS]
+                if self.seqs[lane] == seq:
+                    self.taken[lane] = seq
+                    cmds.append((order, Command(op, Source.AUTO, pan, tilt, zoom, ts)))
+                    break
+
+        cmds.sort()
+        return [cmd for _, cmd in cmds]
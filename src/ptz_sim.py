@@ -0,0 +1,380 @@
+import argparse
+import math
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import cv2
+import numpy as np
+
+from isapi_mock import IsapiHandler, IsapiServer
+
+# Offline stand-in for the PTZ camera: the ISAPI endpoints PtzControl uses,
+# a pan/tilt/zoom model driven by them, and an MJPEG stream rendered from the
+# simulated pose.
+#
+#   python ptz_sim.py --port 8000 --targets 2
+#
+# then point video_path and ptz_address in camera.py at it.
+
+STATUS_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<PTZStatus version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">
+    <AbsoluteHigh>
+        <elevation>{elevation}</elevation>
+        <azimuth>{azimuth}</azimuth>
+        <absoluteZoom>{zoom}</absoluteZoom>
+    </AbsoluteHigh>
+</PTZStatus>
+"""
+
+
+def _angle_diff(a, b):
+    return (a - b + 180) % 360 - 180
+
+
+def _xml_values(body):
+    values = {}
+    for element in ET.fromstring(body).iter():
+        values[element.tag.rsplit("}", 1)[-1]] = element.text
+    return values
+
+
+class PtzModel:
+    """Pan/tilt/zoom state of the simulated camera.
+
+    Continuous speeds (-100..100) turn into deg_per_unit degrees per second,
+    absolute moves slew at max_rate. pose() is where the camera points in
+    the scene, status() the camera's own azimuth and elevation in degrees as
+    reported by the status endpoint. Mounted inverted, the camera's axes are
+    the scene's negated: a negative pan turns it the other way, so after
+    the pipeline's rotation the target moves left as the tracker expects.
+    """
+
+    def __init__(
+        self,
+        deg_per_unit=0.5,
+        max_rate=90.0,
+        zoom_rate=2.0,
+        tilt_limits=(-5.0, 90.0),
+        zoom_limits=(1.0, 30.0),
+        inverted=True,
+    ) -> None:
+        self.deg_per_unit = deg_per_unit
+        self.sign = -1 if inverted else 1
+        self.max_rate = max_rate
+        self.zoom_rate = zoom_rate
+        # the limits are the camera's, in scene elevation when inverted
+        self.tilt_limits = sorted(self.sign * t for t in tilt_limits)
+        self.zoom_limits = zoom_limits
+        self.lock = threading.Lock()
+
+        self.pan = 0.0
+        self.tilt = 0.0
+        self.zoom = 1.0
+        self.speed = (0.0, 0.0, 0.0)
+        self.target = None
+        self.home = (0.0, 0.0, 1.0)
+        self.last = time.monotonic()
+
+    def _step(self):
+        now = time.monotonic()
+        dt = now - self.last
+        self.last = now
+
+        if self.target is not None:
+            pan, tilt, zoom = self.target
+            step = self.max_rate * dt
+            d_pan = _angle_diff(pan, self.pan)
+            d_tilt = tilt - self.tilt
+            self.pan += max(-step, min(step, d_pan))
+            self.tilt += max(-step, min(step, d_tilt))
+            d_zoom = zoom - self.zoom
+            self.zoom += max(-self.zoom_rate * dt, min(self.zoom_rate * dt, d_zoom))
+            if abs(d_pan) <= step and abs(d_tilt) <= step and self.zoom == zoom:
+                self.target = None
+        else:
+            pan, tilt, zoom = self.speed
+            self.pan += pan * self.deg_per_unit * dt
+            self.tilt += tilt * self.deg_per_unit * dt
+            self.zoom += zoom / 100 * self.zoom_rate * dt
+
+        self.pan %= 360
+        self.tilt = min(max(self.tilt, self.tilt_limits[0]), self.tilt_limits[1])
+        self.zoom = min(max(self.zoom, self.zoom_limits[0]), self.zoom_limits[1])
+
+    def pose(self):
+        with self.lock:
+            self._step()
+            return self.pan, self.tilt, self.zoom
+
+    def status(self):
+        pan, tilt, zoom = self.pose()
+        return (self.sign * pan) % 360, self.sign * tilt, zoom
+
+    def continuous(self, pan, tilt, zoom):
+        with self.lock:
+            self._step()
+            self.target = None
+            self.speed = (self.sign * pan, self.sign * tilt, zoom)
+
+    def absolute(self, pan, tilt, zoom):
+        with self.lock:
+            self._step()
+            self.speed = (0.0, 0.0, 0.0)
+            self.target = ((self.sign * pan) % 360, self.sign * tilt, zoom)
+
+    def set_home(self):
+        with self.lock:
+            self._step()
+            self.home = (self.pan, self.tilt, self.zoom)
+
+    def go_home(self):
+        # home is kept as a scene pose
+        with self.lock:
+            self._step()
+            self.speed = (0.0, 0.0, 0.0)
+            self.target = self.home
+
+
+class Scene:
+    """Targets moving in camera coordinates, rendered for a given pose.
+
+    Each target has an azimuth, elevation, angular size and angular velocity
+    in degrees. The frame is what the camera sensor sees; with inverted set
+    the sky is drawn at the bottom like on the upside-down mounted camera, so
+    the pipeline's 180 degree rotation turns it the right way up.
+    """
+
+    def __init__(self, shape, hfov=60.0, targets=1, sprite=None, inverted=True):
+        self.shape = shape
+        self.hfov = hfov
+        self.inverted = inverted
+        self.rng = np.random.default_rng(0)
+        self.targets = [
+            {
+                "az": self.rng.uniform(-20, 20),
+                "el": self.rng.uniform(2, 15),
+                "size": self.rng.uniform(1.0, 3.0),
+                "v_az": self.rng.uniform(-3, 3),
+                "v_el": self.rng.uniform(-0.5, 0.5),
+            }
+            for _ in range(targets)
+        ]
+        self.sprite = None
+        if sprite is not None:
+            self.sprite = cv2.imread(sprite, cv2.IMREAD_UNCHANGED)
+
+        h, w = shape[:2]
+        sky = np.linspace((235, 206, 135), (250, 240, 225), h).astype(np.uint8)
+        self.background = np.repeat(sky[:, None, :], w, axis=1)
+        self.last = time.monotonic()
+
+    def _move(self):
+        now = time.monotonic()
+        dt = now - self.last
+        self.last = now
+        for t in self.targets:
+            t["az"] += t["v_az"] * dt
+            t["el"] += t["v_el"] * dt
+            # wander, and bounce back towards the start area
+            t["v_az"] += self.rng.normal(0, 0.5) * dt - 0.01 * t["az"] * dt
+            t["v_el"] += self.rng.normal(0, 0.2) * dt - 0.05 * (t["el"] - 8) * dt
+
+    def _draw_target(self, frame, x, y, size):
+        if self.sprite is None:
+            cv2.ellipse(
+                frame,
+                (x, y),
+                (max(size // 2, 1), max(size // 4, 1)),
+                0,
+                0,
+                360,
+                (40, 40, 40),
+                -1,
+            )
+            return
+
+        sprite = cv2.resize(self.sprite, (size, size))
+        h, w = frame.shape[:2]
+        x0, y0 = x - size // 2, y - size // 2
+        x1, y1 = max(x0, 0), max(y0, 0)
+        x2, y2 = min(x0 + size, w), min(y0 + size, h)
+        if x1 >= x2 or y1 >= y2:
+            return
+        patch = sprite[y1 - y0 : y2 - y0, x1 - x0 : x2 - x0]
+        if patch.shape[2] == 4:
+            alpha = patch[:, :, 3:] / 255.0
+            roi = frame[y1:y2, x1:x2]
+            roi[:] = (alpha * patch[:, :, :3] + (1 - alpha) * roi).astype(np.uint8)
+        else:
+            frame[y1:y2, x1:x2] = patch
+
+    def render(self, pan, tilt, zoom):
+        self._move()
+        h, w = self.shape[:2]
+        hfov = self.hfov / zoom
+        px_per_deg = w / hfov
+
+        frame = self.background.copy()
+        # horizon and a mark every 10 degrees of azimuth to see the camera move
+        horizon = int(h / 2 + tilt * px_per_deg)
+        if 0 <= horizon < h:
+            frame[horizon:] = (70, 110, 80)
+        first = math.floor((pan - hfov / 2) / 10) * 10
+        for az in range(first, int(pan + hfov / 2) + 10, 10):
+            x = int(w / 2 + _angle_diff(az, pan) * px_per_deg)
+            cv2.line(frame, (x, 0), (x, h), (200, 200, 200), 1)
+            cv2.putText(
+                frame,
+                str(az % 360),
+                (x + 2, 14),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.4,
+                (90, 90, 90),
+                1,
+            )
+
+        for t in self.targets:
+            x = int(w / 2 + _angle_diff(t["az"], pan) * px_per_deg)
+            y = int(h / 2 - (t["el"] - tilt) * px_per_deg)
+            size = max(int(t["size"] * px_per_deg), 2)
+            if -size < x < w + size and -size < y < h + size:
+                self._draw_target(frame, x, y, size)
+
+        if self.inverted:
+            # sky at the bottom, camera hangs upside down
+            frame = cv2.flip(frame, 0)
+            frame = cv2.flip(frame, 1)
+        return frame
+
+
+class SimHandler(IsapiHandler):
+    def _latency(self):
+        # per request, the handler threads run concurrently
+        if not self.server.jitter:
+            return self.server.latency
+        with self.server.lock:
+            extra = self.server.rng.exponential(self.server.jitter)
+        return self.server.latency + extra
+
+    def do_GET(self):
+        if self.path != "/stream.mjpg":
+            return self._handle()
+
+        # MJPEG over HTTP, no auth, readable by cv2.VideoCapture
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.end_headers()
+        last = None
+        try:
+            while True:
+                jpeg = self.server.wait_frame(last)
+                last = jpeg
+                self.wfile.write(
+                    b"--frame\r\nContent-Type: image/jpeg\r\n"
+                    + f"Content-Length: {len(jpeg)}\r\n\r\n".encode()
+                    + jpeg
+                    + b"\r\n"
+                )
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class PtzSimServer(IsapiServer):
+    def __init__(self, address, model, scene, fps=25.0, jitter=0.0, **kwargs):
+        super().__init__(address, handler=SimHandler, **kwargs)
+        self.model = model
+        self.scene = scene
+        self.fps = fps
+        self.jitter = jitter
+        self.rng = np.random.default_rng()
+        self.frame = None
+        self.frame_cond = threading.Condition()
+        threading.Thread(target=self._render, daemon=True).start()
+
+    def _render(self):
+        interval = 1.0 / self.fps
+        next_frame = time.monotonic()
+        while True:
+            frame = self.scene.render(*self.model.pose())
+            jpeg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 85])[1]
+            with self.frame_cond:
+                self.frame = jpeg.tobytes()
+                self.frame_cond.notify_all()
+
+            next_frame += interval
+            time.sleep(max(0.0, next_frame - time.monotonic()))
+
+    def wait_frame(self, last):
+        with self.frame_cond:
+            self.frame_cond.wait_for(lambda: self.frame is not last)
+            return self.frame
+
+    def command(self, method, path, body):
+        if path == "status" and method == "GET":
+            pan, tilt, zoom = self.model.status()
+            reply = STATUS_XML.format(
+                azimuth=int(pan * 10), elevation=int(tilt * 10), zoom=int(zoom * 10)
+            )
+            return 200, reply.encode()
+
+        if path == "continuous" and method == "PUT":
+            values = _xml_values(body)
+            self.model.continuous(
+                float(values.get("pan") or 0),
+                float(values.get("tilt") or 0),
+                float(values.get("zoom") or 0),
+            )
+        elif path == "absolute" and method == "PUT":
+            values = _xml_values(body)
+            self.model.absolute(
+                float(values["azimuth"]) / 10,
+                float(values["elevation"]) / 10,
+                float(values["absoluteZoom"]) / 10,
+            )
+        elif path == "homePosition" and method == "PUT":
+            self.model.set_home()
+        elif path == "homePosition/goto" and method == "PUT":
+            self.model.go_home()
+        elif path == "homePosition" and method == "DELETE":
+            self.model.home = (0.0, 0.0, 1.0)
+        else:
+            return 404, b""
+
+        return super().command(method, path, body)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--width", type=int, default=704)
+    parser.add_argument("--height", type=int, default=576)
+    parser.add_argument("--fps", type=float, default=25.0)
+    parser.add_argument("--hfov", type=float, default=60.0)
+    parser.add_argument("--targets", type=int, default=1)
+    parser.add_argument("--sprite", help="image drawn for each target")
+    parser.add_argument("--upright", action="store_true", help="not mounted inverted")
+    parser.add_argument("--deg-per-unit", type=float, default=0.5)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="mean extra s")
+    args = parser.parse_args()
+
+    model = PtzModel(deg_per_unit=args.deg_per_unit, inverted=not args.upright)
+    scene = Scene(
+        (args.height, args.width, 3),
+        args.hfov,
+        args.targets,
+        args.sprite,
+        not args.upright,
+    )
+    server = PtzSimServer(
+        (args.host, args.port),
+        model,
+        scene,
+        args.fps,
+        args.jitter,
+        latency=args.latency,
+    )
+    print(f"PTZ simulator on http://{args.host}:{args.port}, stream at /stream.mjpg")
+    server.serve_forever()
@@ -0,0 +1,285 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+from multiprocessing import Value
+from frame_ring import FrameRing
+
+# what to do when the encoder falls behind and the queue is full
+DROP_OLDEST = "oldest"
+DROP_NEWEST = "newest"
+
+
+def _encode(writer, work_q, free_q):
+    while True:
+        buf = work_q.get()
+        if buf is None:
+            break
+        writer.write(buf)
+        free_q.put(buf)
+    writer.release()
+
+
+def _segment_path(out_dir, index, ext):
+    # the index keeps names unique when segments start within the same second
+    name = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(out_dir, f"{name}_{index:04d}.{ext}")
+
+
+def _start_segment(out_dir, index, fps, shape, queue_size, free_q):
+    # every segment has its own queue, so the next one can start while this
+    # one's encoder still works through what it was given
+    path = _segment_path(out_dir, index, "avi")
+    print(f"recorder: new segment {path}")
+
+    fourcc = cv2.VideoWriter_fourcc(*"XVID")
+    writer = cv2.VideoWriter(path, fourcc, fps, (shape[1], shape[0]))
+    work_q = queue.Queue(queue_size)
+    encoder = threading.Thread(
+        target=_encode, args=(writer, work_q, free_q), daemon=True
+    )
+    encoder.start()
+    return encoder, work_q
+
+
+def _finish_segment(encoder, work_q, frames, dropped):
+    work_q.put(None)
+    encoder.join()
+    print(f"recorder: segment done, {frames} frames, {dropped} dropped")
+
+
+def recorder(
+    ring_name,
+    shape,
+    dtype,
+    stop_flag,
+    new_frame,
+    stream_fps,
+    dropped,
+    out_dir="../recordings",
+    segment_seconds=300,
+    queue_size=32,
+    drop=DROP_OLDEST,
+):
+    ring = FrameRing(ring_name, shape, dtype)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # copies for the encoder come from a fixed pool, nothing is allocated per frame
+    free_q = queue.Queue()
+    for _ in range(queue_size + 1):
+        free_q.put(np.empty(shape, dtype=dtype))
+
+    encoder = None
+    work_q = None
+    # segments whose encoders are still finishing
+    finishing = []
+    segment = 0
+    segment_start = timer()
+    segment_frames = 0
+    segment_dropped = 0
+    last_id = 0
+
+    while True:
+        if stop_flag.value == 1:
+            break
+
+        if not new_frame.wait(0.25):
+            continue
+
+        if encoder is None:
+            # the grabber fills stream_fps in once the stream is open
+            fps = stream_fps.value or 25.0
+            segment_start = timer()
+            segment += 1
+            encoder, work_q = _start_segment(
+                out_dir, segment, fps, shape, queue_size, free_q
+            )
+
+        latest_id = ring.latest_id()
+        if last_id == 0:
+            last_id = latest_id - 1
+
+        # frames that already fell out of the ring are lost
+        first_id = max(last_id + 1, latest_id - ring.slots + 2)
+        segment_dropped += first_id - (last_id + 1)
+
+        for frame_id in range(first_id, latest_id + 1):
+            frame = ring.get(frame_id)
+            if frame is None:
+                segment_dropped += 1
+                continue
+
+            if drop == DROP_OLDEST and work_q.full():
+                try:
+                    free_q.put(work_q.get_nowait())
+                    segment_frames -= 1
+                    segment_dropped += 1
+                except queue.Empty:
+                    pass
+
+            try:
+                buf = free_q.get_nowait()
+            except queue.Empty:
+                segment_dropped += 1
+                continue
+
+            np.copyto(buf, frame)
+            if not ring.valid(frame_id):
+                free_q.put(buf)
+                segment_dropped += 1
+                continue
+
+            try:
+                work_q.put_nowait(buf)
+                segment_frames += 1
+            except queue.Full:
+                # DROP_NEWEST
+                free_q.put(buf)
+                segment_dropped += 1
+
+        last_id = latest_id
+
+        if timer() - segment_start >= segment_seconds:
+            # the old encoder finishes in the background, joining it here
+            # would back up the ring
+            finisher = threading.Thread(
+                target=_finish_segment,
+                args=(encoder, work_q, segment_frames, segment_dropped),
+                daemon=True,
+            )
+            finisher.start()
+            finishing = [t for t in finishing if t.is_alive()] + [finisher]
+            with dropped.get_lock():
+                dropped.value += segment_dropped
+            segment_frames = 0
+            segment_dropped = 0
+
+            segment_start = timer()
+            segment += 1
+            encoder, work_q = _start_segment(
+                out_dir, segment, fps, shape, queue_size, free_q
+            )
+
+    for finisher in finishing:
+        finisher.join()
+    if encoder is not None:
+        _finish_segment(encoder, work_q, segment_frames, segment_dropped)
+        with dropped.get_lock():
+            dropped.value += segment_dropped
+        print(f"recorder: stopped, {dropped.value} frames dropped in total")
+
+    ring.close()
+
+
+def _open_segment(out_dir, index, container, in_stream):
+    import av
+
+    path = _segment_path(out_dir, index, container)
+    print(f"recorder: new segment {path}")
+
+    out = av.open(path, "w")
+    if hasattr(out, "add_stream_from_template"):
+        out_stream = out.add_stream_from_template(in_stream)
+    else:
+        out_stream = out.add_stream(template=in_stream)
+    return out, out_stream
+
+
+def remux_recorder(
+    video_path,
+    stop_flag,
+    out_dir="../recordings",
+    segment_seconds=300,
+    container="mkv",
+):
+    # copies the camera's H.264 packets into segments without decoding them,
+    # uses its own connection so the grabber keeps decoding for inference
+    import av
+
+    os.makedirs(out_dir, exist_ok=True)
+    options = {"rtsp_transport": "tcp"} if video_path.startswith("rtsp") else {}
+    segment = 0
+
+    while True:
+        if stop_flag.value == 1:
+            break
+
+        try:
+            src = av.open(video_path, options=options, timeout=5.0)
+        except av.error.FFmpegError as e:
+            print(f"recorder: cannot open stream: {e}")
+            time.sleep(1.0)
+            continue
+
+        in_stream = src.streams.video[0]
+        out = None
+        out_stream = None
+        offset = 0
+        segment_start = 0.0
+        packets = 0
+
+        try:
+            for packet in src.demux(in_stream):
+                if stop_flag.value == 1:
+                    break
+
+                # demux ends with an empty flush packet
+                if packet.dts is None:
+                    continue
+
+                t = float(packet.dts * in_stream.time_base)
+                # segments can only start on a keyframe
+                if packet.is_keyframe and (
+                    out is None or t - segment_start >= segment_seconds
+                ):
+                    if out is not None:
+                        out.close()
+                        print(f"recorder: segment done, {packets} packets")
+                    segment += 1
+                    out, out_stream = _open_segment(
+                        out_dir, segment, container, in_stream
+                    )
+                    offset = packet.dts
+                    segment_start = t
+                    packets = 0
+
+                if out is None:
+                    continue
+
+                packet.dts -= offset
+                if packet.pts is not None:
+                    packet.pts -= offset
+                packet.stream = out_stream
+                out.mux(packet)
+                packets += 1
+        except av.error.FFmpegError as e:
+            print(f"recorder: stream error: {e}")
+        finally:
+            if out is not None:
+                out.close()
+                print(f"recorder: segment done, {packets} packets")
+            src.close()
+
+        # a live stream that ended gets reopened, a file is done
+        if "://" not in video_path:
+            break
+
+
+if __name__ == "__main__":
+    # python recorder.py input.mp4 --out-dir /tmp/rec --segment 10
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", help="file or rtsp:// url")
+    parser.add_argument("--out-dir", default="../recordings")
+    parser.add_argument("--segment", type=float, default=300)
+    parser.add_argument("--container", default="mkv", choices=("mkv", "mp4"))
+    args = parser.parse_args()
+
+    remux_recorder(
+        args.source, Value("i", 0), args.out_dir, args.segment, args.container
+    )
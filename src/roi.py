@@ -0,0 +1,58 @@
+import numpy as np
+
+
+class RoiSelector:
+    """Picks the window the detector looks at while a target is locked.
+
+    target() follows the locked box through every result, detected or
+    propagated, and keeps its centre, velocity and size. window() returns a
+    square around where the target should be now, at least size pixels and
+    margin times the box, or None for a full-frame detection: when nothing
+    is locked, when the last result lost the target, and every full_every
+    detections so new targets still get picked up.
+    """
+
+    def __init__(self, size=320, margin=3.0, full_every=10) -> None:
+        self.size = size
+        self.margin = margin
+        self.full_every = full_every
+        self.centre = None
+        self.velocity = np.zeros(2)
+        self.box_size = 0.0
+        self.time = 0.0
+        self.count = 0
+
+    def target(self, boxes, locked, now):
+        # boxes as x1, y1, x2, y2, id, conf, class rows in frame pixels
+        row = None
+        if locked is not None and len(boxes):
+            rows = np.flatnonzero(boxes[:, 4] == locked)
+            if len(rows):
+                row = boxes[rows[0]]
+        if row is None:
+            self.centre = None
+            return False
+
+        centre = (row[:2] + row[2:4]) / 2
+        if self.centre is not None and now > self.time:
+            velocity = (centre - self.centre) / (now - self.time)
+            self.velocity = 0.5 * self.velocity + 0.5 * velocity
+        else:
+            self.velocity = np.zeros(2)
+        self.centre = centre
+        self.box_size = float(max(row[2] - row[0], row[3] - row[1]))
+        self.time = now
+        return True
+
+    def window(self, shape, now):
+        if self.centre is None or self.count >= self.full_every:
+            self.count = 0
+            return None
+
+        h, w = shape[:2]
+        side = int(min(max(self.size, self.margin * self.box_size), h, w))
+        centre = self.centre + self.velocity * (now - self.time)
+        x1 = int(min(max(centre[0] - side / 2, 0), w - side))
+        y1 = int(min(max(centre[1] - side / 2, 0), h - side))
+        self.count += 1
+        return x1, y1, x1 + side, y1 + side
@@ -0,0 +1,54 @@
+import threading
+import time
+from multiprocessing import Array
+
+# indices into a camera's startup times, time.monotonic() values, 0 until
+# reached
+START = 0
+READY = 1  # all workers of the camera initialized, capture starts
+FIRST_FRAME = 2  # first frame through inference
+FIRST_PTZ = 3  # first command sent to the PTZ head
+_NAMES = {
+    READY: "workers ready",
+    FIRST_FRAME: "first frame through inference",
+    FIRST_PTZ: "first PTZ command",
+}
+
+# model loading and backend benchmarks included
+TIMEOUT = 180.0
+
+
+def new_times():
+    times = Array("d", 4, lock=False)
+    times[START] = time.monotonic()
+    return times
+
+
+def mark(times, index):
+    if times is not None and times[index] == 0:
+        times[index] = time.monotonic()
+
+
+def ready(barrier, name):
+    # this worker is initialized, wait for the others of its camera
+    if barrier is None:
+        return
+    try:
+        barrier.wait(TIMEOUT)
+    except threading.BrokenBarrierError:
+        print(f"{name}: not all workers got ready, starting anyway")
+
+
+def report(cameras, stop_flag):
+    # print each camera's startup milestones as they are reached;
+    # cameras maps names to startup times
+    pending = {(name, index) for name in cameras for index in _NAMES}
+    while pending and stop_flag.value != 1:
+        for name, index in sorted(pending):
+            times = cameras[name]
+            if times[index]:
+                print(
+                    f"{name}: {_NAMES[index]} after {times[index] - times[START]:.2f} s"
+                )
+                pending.discard((name, index))
+        time.sleep(0.1)
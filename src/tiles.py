@@ -0,0 +1,83 @@
+import numpy as np
+
+
+def tile_windows(shape, tile=640, overlap=0.2):
+    """Overlapping tile windows covering a frame of the given shape.
+
+    Tiles are tile pixels square (smaller only if the frame is) and overlap
+    by at least overlap of a tile, so a target up to that size is whole in
+    at least one tile. The last row and column are aligned to the frame
+    edge instead of sticking out.
+    """
+    h, w = shape[:2]
+
+    def starts(length):
+        side = min(tile, length)
+        if side == length:
+            return [0], side
+        count = int(np.ceil((length - side) / (side * (1 - overlap)))) + 1
+        return np.linspace(0, length - side, count).astype(int).tolist(), side
+
+    xs, tw = starts(w)
+    ys, th = starts(h)
+    return [(x, y, x + tw, y + th) for y in ys for x in xs]
+
+
+def merge(boxes, iou=0.5, ios=0.8):
+    """Class-aware NMS over detections from several tiles.
+
+    boxes are x1, y1, x2, y2, conf, class rows in frame pixels. A box is
+    suppressed by a better one of the same class if their IoU is above iou,
+    or if most of the smaller of the two (ios) lies inside the other, which
+    is what a target cut by a tile border looks like; the kept box then
+    grows to cover both.
+    """
+    if len(boxes) < 2:
+        return boxes
+
+    boxes = boxes[np.argsort(-boxes[:, 4])].copy()
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    alive = np.ones(len(boxes), dtype=bool)
+    for i in range(len(boxes)):
+        if not alive[i]:
+            continue
+        keep.append(i)
+        rest = np.flatnonzero(alive[i + 1 :]) + i + 1
+        rest = rest[boxes[rest, 5] == boxes[i, 5]]
+        if not len(rest):
+            continue
+
+        x1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        union = areas[i] + areas[rest] - inter
+        smaller = np.minimum(areas[i], areas[rest])
+        same = inter > iou * union
+        # a piece of the target: grow the kept box over it instead of
+        # keeping whichever piece scored higher
+        piece = ~same & (inter > ios * smaller)
+        if piece.any():
+            boxes[i, :2] = np.minimum(boxes[i, :2], boxes[rest[piece], :2].min(0))
+            boxes[i, 2:4] = np.maximum(boxes[i, 2:4], boxes[rest[piece], 2:4].max(0))
+            areas[i] = (boxes[i, 2] - boxes[i, 0]) * (boxes[i, 3] - boxes[i, 1])
+        alive[rest[same | piece]] = False
+
+    return boxes[keep]
+
+
+def predict_windows(model, frame, windows, imgsz, **kwargs):
+    # one batch over the windows, boxes as merged x1, y1, x2, y2, conf, class
+    # rows in frame pixels
+    crops = [np.ascontiguousarray(frame[y1:y2, x1:x2]) for x1, y1, x2, y2 in windows]
+    data = []
+    for (x1, y1, _, _), result in zip(
+        windows, model.predict(crops, imgsz=imgsz, verbose=False, **kwargs)
+    ):
+        boxes = result.boxes.data.cpu().numpy().copy()
+        boxes[:, [0, 2]] += x1
+        boxes[:, [1, 3]] += y1
+        data.append(boxes)
+    return merge(np.concatenate(data))
@@ -0,0 +1,158 @@
+import os
+import time
+from typing import NamedTuple
+
+_TICKS = os.sysconf("SC_CLK_TCK")
+
+# indices into a camera's grab counts array
+GRABBED = 0
+# OpenCV decodes in grab(), this counts the retrieve() calls
+RETRIEVED = 1
+PUBLISHED = 2
+
+
+class Camera(NamedTuple):
+    """One PTZ camera of the site, see the cameras list in camera.py."""
+
+    name: str
+    video_path: str
+    # ISAPI host and port of the PTZ head
+    ptz_address: tuple
+    # (1440, 2560, 3), (1080, 1920, 3), (720, 1280, 3) for the main streams
+    shape: tuple = (576, 704, 3)
+    slots: int = 8
+    # mounted upside down
+    orientation: str = "rot180"
+    # leave the pixels alone and rotate the detected boxes in Tracker instead
+    rotate_boxes: bool = False
+    # "remux" copies the camera's H.264 packets into mkv segments,
+    # "encode" re-encodes the decoded frames to XVID, None disables recording
+    record: str = "remux"
+    record_segment: int = 300
+    # run the detector on every k-th frame and move the boxes with optical
+    # flow in between, None adapts k to the model speed
+    detect_every: int = 1
+    # while locked, detect on a window of at least roi_size pixels around the
+    # target at full resolution, 0 always uses the whole frame. The model has
+    # to take roi_size input: a .pt model or an export with dynamic=True
+    roi_size: int = 0
+    # full-frame detections on overlapping tiles of this size, in one batch,
+    # for the high resolution streams; 0 sends the whole frame
+    tile_size: int = 0
+    # model backend from backends.BACKENDS, "auto" benchmarks the available
+    # ones on the first frame and remembers the fastest for this machine
+    backend: str = "auto"
+    display_uri: str = "ws://10.66.66.1:8080/andros/sender"
+    # JPEGs per second to display_uri, 0 sends metadata only
+    display_fps: float = 10
+    # JSON metadata messages per second (boxes, locked id, PTZ state, see
+    # annotate.metadata), each JPEG is preceded by the one for its frame;
+    # 0 sends none, the old viewer only takes JPEGs
+    meta_fps: float = 0
+    # "annotated" draws the boxes into the JPEGs, "raw" leaves that to the
+    # viewer; display_scale resizes the JPEGs
+    display_mode: str = "annotated"
+    display_scale: float = 1.0
+    # JPEG encoding threads in the display process
+    display_encoders: int = 2
+
+
+def check_shared_model(cameras):
+    """Raises ValueError for settings inference_server does not support.
+
+    With several cameras one model process serves them all: every frame is
+    detected in full and tracked, and there is a single backend.
+    """
+    problems = []
+    for cam in cameras:
+        for field, default in (("detect_every", 1), ("roi_size", 0), ("tile_size", 0)):
+            if getattr(cam, field) != default:
+                problems.append(f"{cam.name}: {field}={getattr(cam, field)}")
+    backends = {cam.backend for cam in cameras}
+    if len(backends) > 1:
+        problems.append(f"backends differ: {sorted(backends)}")
+    if problems:
+        raise ValueError(
+            "not supported with a shared model (more than one camera): "
+            + ", ".join(problems)
+        )
+
+
+def check_display(cameras):
+    """Raises ValueError for display settings the display process cannot run."""
+    problems = []
+    for cam in cameras:
+        if cam.display_encoders < 1:
+            problems.append(
+                f"{cam.name}: display_encoders={cam.display_encoders}, "
+                "needs at least one encoding thread"
+            )
+        if not cam.display_fps and not cam.meta_fps:
+            problems.append(f"{cam.name}: display_fps and meta_fps are both 0")
+        if cam.display_mode not in ("annotated", "raw"):
+            problems.append(f"{cam.name}: display_mode={cam.display_mode!r}")
+        if cam.display_scale <= 0:
+            problems.append(f"{cam.name}: display_scale={cam.display_scale}")
+    if problems:
+        raise ValueError("invalid display settings: " + ", ".join(problems))
+
+
+class StreamSpec(NamedTuple):
+    # one camera served by inference_server
+    in_ring_name: str
+    out_ring_name: str
+    out_boxes_name: str
+    shape: tuple
+    out_notify: list
+    box_orientation: str
+    # Tracker arguments from coords_lon up to ptz_state
+    tracker_args: tuple
+    cmd_q: object
+    trace: object
+    # startup barrier and times of the camera, see startup.py
+    barrier: object
+    times: object
+
+
+def _cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        # the command name may contain spaces, fields count from after it
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / _TICKS
+
+
+def _rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class Usage:
+    """CPU and resident memory of groups of processes, from /proc.
+
+    sample() returns the CPU use in percent of one core since the previous
+    sample of the same group, and the summed RSS in MB.
+    """
+
+    def __init__(self) -> None:
+        self.last = {}
+
+    def sample(self, group, processes):
+        now = time.monotonic()
+        cpu = 0.0
+        rss = 0.0
+        for p in processes:
+            try:
+                cpu += _cpu_seconds(p.pid)
+                rss += _rss_mb(p.pid)
+            except (OSError, TypeError):
+                # not started or already gone
+                pass
+
+        last_time, last_cpu = self.last.get(group, (None, 0.0))
+        self.last[group] = (now, cpu)
+        if last_time is None:
+            return float("nan"), rss
+        return 100 * (cpu - last_cpu) / (now - last_time), rss
@@ -2,8 +2,13 @@ import math
 import numpy as np
 from ultralytics.engine.results import Boxes
 from timeit import default_timer as timer
+from time import monotonic
 from collections import deque
 from statistics import mean
+from orientation import orient_boxes
+from ptz_commands import Command, Op
+from ptz_driver import UPDATED, DONE_TS
+from pan_tilt import PanTiltController
 
 
 def cart2pol(x, y):
@@ -33,13 +38,15 @@ class Tracker:
         mag_angle,
         # mag_new,
         # mag_lock,
-        cmd_q,
+        mailbox,
+        ptz_state=None,
+        box_orientation="none",
     ) -> None:
         self.last_track = timer()
 
         self.locked = None
         self.locked_box = None
-        self.correcting = False
+        self.controller = PanTiltController()
         self.last_lock = timer()
 
         self.coords_lon = coords_lon
@@ -69,7 +76,13 @@ class Tracker:
         self.last_tilt_change = timer()
         self.last_tilt_dir = 1
 
-        self.cmd_q = cmd_q
+        self.mailbox = mailbox
+        # camera position and finished moves reported by the control process
+        self.ptz_state = ptz_state
+        self.abs_ts = 0.0
+
+        # frames are not rotated by the grabber, rotate the boxes instead
+        self.box_orientation = box_orientation
 
         self.targets = dict()
 
@@ -77,6 +90,8 @@ class Tracker:
         # print(boxes)
         if boxes and boxes.is_track:
             bounds = boxes.xywhn.cpu()
+            if self.box_orientation != "none":
+                bounds = orient_boxes(bounds, self.box_orientation)
             track_ids = boxes.id.int().cpu().tolist()
             confs = boxes.conf.cpu()
 
@@ -86,7 +101,6 @@ class Tracker:
 
             if self.locked is not None and self.locked not in track_ids:
                 self.locked = None
-                self.correcting = False
 
             for id, conf in zip(track_ids, confs):
                 if conf > 0.4:
@@ -132,49 +146,19 @@ class Tracker:
         if time - self.last_track < 0.1:
             return
         self.last_track = time
-        speed = -34
         print(f"track: {self.locked}")
         if self.locked is not None:
             self.patrol_start = None
             x, y, w, h = self.locked_box
-            pan = 0
-            tilt = 0
             # TODO: zoom based on w, h?
 
-            if self.correcting:
-                if x > 0.6:
-                    pan = speed
-                elif x < 0.4:
-                    pan = -1 * speed
-
-                if y > 0.6:
-                    tilt = -1 * speed
-                elif y < 0.4:
-                    tilt = speed
-
-                self.cmd_q.put(f"a c {pan} {tilt} 0")
-                if pan == 0 and tilt == 0:
-                    self.correcting = False
-
-                return
-
-            if x > 0.6:
-                pan = speed
-            elif x < 0.4:
-                pan = -1 * speed
-
-            if y > 0.6:
-                tilt = -1 * speed
-            elif y < 0.4:
-                tilt = speed
-
-            self.cmd_q.put(f"a c {pan} {tilt} 0")
-
-            if pan != 0 or tilt != 0:
-                self.correcting = True
+            pan, tilt = self.controller.update(float(x), float(y), time)
+            self.mailbox.post(Command.new(Op.CONT, pan=pan, tilt=tilt))
 
             return
 
+        self.controller.reset()
+
         if time - self.last_lock < 1.0:
             return
 
@@ -195,19 +179,19 @@ class Tracker:
         if self.patrol_start is None:
             # self.patrolling = False
             self.patrol_start = time
-            self.cmd_q.put("a a 0 35 1")
-            # self.cmd_q.put("a c -34 100 -100")
+            self.move_abs(0, 35, 1)
+            # self.mailbox.post(Command.new(Op.CONT, pan=-34, tilt=100, zoom=-100))
             return
 
-        if time - self.patrol_start < 2.0:
-            # already patrolling or started patrolling recently, wait for tilt to finish adjusting
+        if not self.move_done(time - self.patrol_start):
+            # started patrolling recently, wait for tilt to finish adjusting
             return
 
         if time - self.last_tilt_change > 2:
             self.last_tilt_change = time
             self.last_tilt_dir *= -1
         tilt = self.last_tilt_dir * 34
-        self.cmd_q.put(f"a c -34 {tilt} 0")
+        self.mailbox.post(Command.new(Op.CONT, pan=-34, tilt=tilt))
         # self.patrolling = True
 
         return
@@ -216,4 +200,18 @@ class Tracker:
         (radius, angle_rad) = cart2pol(lon - self.gps_lon, lat - self.gps_lat)
         angle_deg = (math.degrees(angle_rad) + self.angle_offset()) % 360
         # TODO: tilt based on distance?
-        self.cmd_q.put(f"a a {angle_deg} 0 1")
+        self.move_abs(angle_deg, 0, 1)
+
+    def move_abs(self, pan, tilt, zoom):
+        cmd = Command.new(Op.ABS, pan=pan, tilt=tilt, zoom=zoom)
+        if self.mailbox.post(cmd):
+            self.abs_ts = cmd.ts
+
+    def move_done(self, elapsed):
+        # the control process reports finished absolute moves by issue time
+        state = self.ptz_state
+        if state is not None and monotonic() - state[UPDATED] < 1.0:
+            return state[DONE_TS] >= self.abs_ts or elapsed > 10.0
+
+        # no status from the camera, fall back to a fixed wait
+        return elapsed > 2.0
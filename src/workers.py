@@ -0,0 +1,63 @@
+# Process entry points for camera.py. Each worker imports its module in the
+# child, so the parent never loads torch, ultralytics, websockets or the
+# sensor drivers before forking, and the workers import in parallel.
+
+
+def frame_grabber(*args):
+    from frame_grabber import frame_grabber
+
+    frame_grabber(*args)
+
+
+def inference(*args):
+    from inference import inference
+
+    inference(*args)
+
+
+def inference_server(*args):
+    from inference import inference_server
+
+    inference_server(*args)
+
+
+def display(*args):
+    from display import display
+
+    display(*args)
+
+
+def control(*args):
+    from control import control
+
+    control(*args)
+
+
+def mpu(*args):
+    from mpu import mpu
+
+    mpu(*args)
+
+
+def gps(*args):
+    from gps import gps
+
+    gps(*args)
+
+
+def coords_recv(*args):
+    from coords_recv import coords_recv
+
+    coords_recv(*args)
+
+
+def recorder(*args):
+    from recorder import recorder
+
+    recorder(*args)
+
+
+def remux_recorder(*args):
+    from recorder import remux_recorder
+
+    remux_recorder(*args)